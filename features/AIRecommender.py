@@ -1,57 +1,234 @@
-from llama_cpp import Llama
-from typing import Dict
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Hashable, Iterator, List, Optional
+from features.FastDecode import (
+    JSONArrayCounter, activity_target, check_decode_mode, complete_until,
+    make_draft_model, suggestion_token_budget
+)
+from features.ModelRegistry import ModelRegistry, default_registry
+from features.Scheduling import Activity
+from features.StructuredOutput import activity_from_record, get_grammar, parse_activity_records
+
+if TYPE_CHECKING:
+    from features.InferenceQueue import InferenceQueue
+    from features.SuggestionCache import SuggestionCache
+
+# Static part of the suggestion prompt; its KV state is evaluated once and reused
+SUGGESTION_PROMPT_PREFIX = """Plan a trip using the trip details given at the end.
+
+1. First, provide a detailed description of the destination during this season, including:
+   - Weather conditions and what to expect
+   - General pricing levels for the period (peak vs off-peak)
+   - Major events or festivals happening
+   - Tourist density and booking recommendations
+
+2. Given the traveler's interests and budget, suggest specific activities and experiences.
+   For each activity, include:
+   - Name and description of the activity
+   - Estimated duration (in hours or days)
+   - Approximate price range in USD
+   - Best time of day/week to do it
+   - Any special notes (booking requirements, seasonal availability, etc.)
+
+3. Organize the activities by category (e.g., Cultural, Outdoor, Culinary, etc.)
+   and indicate which ones best match the user's stated interests.
+
+Please provide specific, practical suggestions that align with the traveler's interests and budget.
+"""
+
+# Static part of the structured prompt; the grammar forces a bare JSON array
+STRUCTURED_PROMPT_PREFIX = """Suggest specific activities and experiences for the trip described at the end that match the traveler's interests and budget.
+
+Answer only with a JSON array. Each element has: name, category (e.g. Cultural, Outdoor, Culinary), duration_hours, price_min and price_max in USD, and best_time (morning, afternoon, evening or flexible).
+"""
 
 class TripSuggestionGenerator:
-    def __init__(self, model_path: str = "llama-2-13b-chat.gguf"):
+    def __init__(self, model_path: str = "llama-2-13b-chat.gguf",
+                 registry: Optional[ModelRegistry] = None,
+                 reuse_prompt_prefix: bool = True,
+                 cache: Optional['SuggestionCache'] = None,
+                 decode_mode: str = 'standard',
+                 draft_model_path: Optional[str] = None):
         """
         Initialize the Llama model for generating trip suggestions.
+        The model is loaded on the first generation; call warm_up() to load it sooner.
         Args:
             model_path: Path to the Llama model file
+            registry: Model registry to share weights through (defaults to the process-wide one)
+            reuse_prompt_prefix: Restore the saved KV state of the static prompt prefix
+            cache: Optional memoization of suggestions by questionnaire answers
+            decode_mode: 'standard', or a fast mode from features.FastDecode.DECODE_MODES
+                that sizes max_tokens to the trip, stops once enough activities are
+                generated and, for 'prompt_lookup'/'draft', decodes speculatively
+            draft_model_path: Small GGUF model sharing the main model's vocabulary, for 'draft'
         """
-        self.llm = Llama(
-            model_path=model_path,
+        check_decode_mode(decode_mode, draft_model_path)
+        self.registry = registry or default_registry
+        self.reuse_prompt_prefix = reuse_prompt_prefix
+        self.cache = cache
+        self.decode_mode = decode_mode
+        self.draft_model = make_draft_model(decode_mode, self.registry, draft_model_path, n_ctx=4096)
+        self.llm = self.registry.acquire(
+            model_path,
             n_ctx=4096,
             n_batch=512,
-            n_threads=4
+            n_threads=4,
+            draft_model=self.draft_model
         )
 
+    def close(self):
+        """Release this generator's handle on the shared model."""
+        self.llm.release()
+        if hasattr(self.draft_model, 'release'):
+            self.draft_model.release()
+
+    def _max_tokens(self, answers: Dict) -> int:
+        return 2048 if self.decode_mode == 'standard' else suggestion_token_budget(answers)
+
+    def warm_up(self) -> threading.Thread:
+        """Load the model in the background; join() the returned thread to wait."""
+        return self.llm.warm_up()
+
+    @property
+    def ready(self) -> bool:
+        """Whether the model is loaded and generations won't wait for it."""
+        return self.llm.ready
+
+    def _build_prompt(self, answers: Dict, prefix: str = SUGGESTION_PROMPT_PREFIX) -> str:
+        """Build the suggestion prompt from questionnaire answers."""
+        # Only the trip details vary, so they go last to keep the prefix reusable
+        return prefix + f"""
+Trip details:
+- Destination: {answers['destination']}
+- Travel dates: {answers['startDate']}
+- Duration: {answers['duration']}
+- Interests: {', '.join(answers['interests'])}
+- Budget: {answers['budget']}"""
+
     def generate_suggestions(self, answers: Dict) -> str:
         """
         Generate trip suggestions based on questionnaire answers.
         Args:
             answers: Dictionary containing questionnaire responses
         Returns:
-            str: Formatted trip suggestions
+            str: Formatted trip suggestions, or the cache's parsed form if
+                the cache was created with a parser
         """
-        prompt = f"""Based on a trip to {answers['destination']} in {answers['startDate']} for {answers['duration']}:
+        if self.cache is not None:
+            return self.cache.memoize(answers, lambda: self._generate(answers))
+        return self._generate(answers)
 
-1. First, provide a detailed description of the destination during this season, including:
-   - Weather conditions and what to expect
-   - General pricing levels for the period (peak vs off-peak)
-   - Major events or festivals happening
-   - Tourist density and booking recommendations
+    async def agenerate_suggestions(self, answers: Dict, queue: 'InferenceQueue',
+                                    client_id: Hashable = None) -> Any:
+        """
+        Async variant of generate_suggestions that shares the model through a queue.
+        Cancelling the awaiting task stops generation at the next token.
+        Args:
+            answers: Dictionary containing questionnaire responses
+            queue: Inference queue shared by all concurrent users
+            client_id: Fairness key for this user or session
+        """
+        if self.cache is not None:
+            cached = self.cache.get(answers)
+            if cached is not None:
+                return cached
 
-2. Given that the traveler is interested in {', '.join(answers['interests'])}, 
-   with a {answers['budget']} budget, suggest specific activities and experiences.
-   For each activity, include:
-   - Name and description of the activity
-   - Estimated duration (in hours or days)
-   - Approximate price range in USD
-   - Best time of day/week to do it
-   - Any special notes (booking requirements, seasonal availability, etc.)
+        def run(cancelled: threading.Event) -> Any:
+            if self.cache is not None:
+                return self.cache.memoize(answers, lambda: self._generate_until(answers, cancelled))
+            return self._generate_until(answers, cancelled)
 
-3. Organize the activities by category (e.g., Cultural, Outdoor, Culinary, etc.)
-   and indicate which ones best match the user's stated interests.
+        return await queue.submit(run, client_id=client_id)
 
-Please provide specific, practical suggestions that align with the traveler's interests and budget."""
+    def _generate_until(self, answers: Dict, cancelled: threading.Event) -> str:
+        """Stream a completion, giving up (and caching nothing) once `cancelled` is set."""
+        from concurrent.futures import CancelledError
 
+        chunks = []
+        stream = self.stream_suggestions(answers)
+        try:
+            for text in stream:
+                if cancelled.is_set():
+                    raise CancelledError()
+                chunks.append(text)
+        finally:
+            stream.close()  # Frees the model for the next request
+        return ''.join(chunks)
+
+    def _generate(self, answers: Dict) -> str:
+        """Run the model for a set of answers, bypassing the cache."""
         # Generate response from Llama
         response = self.llm(
-            prompt,
-            max_tokens=2048,
+            self._build_prompt(answers),
+            operation='suggestions',
+            decode_mode=self.decode_mode,
+            cached_prefix=SUGGESTION_PROMPT_PREFIX if self.reuse_prompt_prefix else None,
+            max_tokens=self._max_tokens(answers),
+            temperature=0.7,
+            top_p=0.95,
+            repeat_penalty=1.2
+        )
+
+        return response['choices'][0]['text']
+
+    def stream_suggestions(self, answers: Dict) -> Iterator[str]:
+        """
+        Generate trip suggestions, yielding text as the model produces it.
+        The model stays locked until the stream is exhausted or closed. Managers sharing
+        it (e.g. ReservationManager through the registry) wait on other threads and raise
+        RuntimeError on this one, so booking lookups overlap with parsing and scheduling
+        the streamed activities, not with the decode itself.
+        Args:
+            answers: Dictionary containing questionnaire responses
+        Returns:
+            Iterator[str]: Text fragments in generation order
+        """
+        stream = self.llm(
+            self._build_prompt(answers),
+            operation='suggestions',
+            decode_mode=self.decode_mode,
+            cached_prefix=SUGGESTION_PROMPT_PREFIX if self.reuse_prompt_prefix else None,
+            max_tokens=self._max_tokens(answers),
+            temperature=0.7,
+            top_p=0.95,
+            repeat_penalty=1.2,
+            stream=True
+        )
+
+        for chunk in stream:
+            text = chunk['choices'][0]['text']
+            if text:
+                yield text
+
+    def generate_activities(self, answers: Dict) -> List[Activity]:
+        """
+        Generate activities as grammar-constrained JSON records instead of prose.
+        Args:
+            answers: Dictionary containing questionnaire responses
+        Returns:
+            List[Activity]: One Activity per record; invalid records are dropped
+        """
+        settings = dict(
+            operation='structured_activities',
+            decode_mode=self.decode_mode,
+            cached_prefix=STRUCTURED_PROMPT_PREFIX if self.reuse_prompt_prefix else None,
+            grammar=get_grammar('activities'),
             temperature=0.7,
             top_p=0.95,
             repeat_penalty=1.2
         )
+        prompt = self._build_prompt(answers, STRUCTURED_PROMPT_PREFIX)
+        if self.decode_mode == 'standard':
+            text = self.llm(prompt, max_tokens=1024, **settings)['choices'][0]['text']
+        else:
+            # Stop once the trip's timeblocks can be filled; the open array is salvaged below
+            target = activity_target(answers)
+            text = complete_until(self.llm, prompt, JSONArrayCounter(target),
+                                  max_tokens=min(1024, 70 * target + 16), **settings)
 
-        return response['choices'][0]['text']
\ No newline at end of file
+        activities = []
+        for record in parse_activity_records(text):
+            try:
+                activities.append(activity_from_record(record))
+            except ValueError:
+                continue
+        return activities
\ No newline at end of file
@@ -0,0 +1,166 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from features.Scheduling import Activity
+
+TIMEBLOCKS = ('morning', 'afternoon', 'evening')
+
+class ActivityTable:
+    def __init__(self, capacity: int = 1024):
+        """
+        Struct-of-arrays store for large activity catalogs.
+        Numeric fields live in NumPy columns; names and categories are interned.
+        Args:
+            capacity: Initial number of rows to allocate
+        """
+        self.size = 0
+        self.duration = np.zeros(capacity, dtype=np.float32)
+        self.price_min = np.zeros(capacity, dtype=np.float64)
+        self.price_max = np.zeros(capacity, dtype=np.float64)
+        self.category_code = np.zeros(capacity, dtype=np.int32)
+        self.preferred_code = np.full(capacity, -1, dtype=np.int8)  # index into TIMEBLOCKS, -1 = flexible
+        self.latitude = np.full(capacity, np.nan, dtype=np.float64)  # NaN = no location
+        self.longitude = np.full(capacity, np.nan, dtype=np.float64)
+        self.names: List[str] = []
+        self.categories: List[str] = []
+        self._category_codes: Dict[str, int] = {}
+
+    def _grow(self):
+        capacity = max(16, 2 * len(self.duration))
+        fill = {'preferred_code': -1, 'latitude': np.nan, 'longitude': np.nan}
+        for column in ('duration', 'price_min', 'price_max', 'category_code', 'preferred_code',
+                       'latitude', 'longitude'):
+            old = getattr(self, column)
+            new = np.full(capacity, fill.get(column, 0), dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, column, new)
+
+    def category_code_for(self, category: str) -> int:
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def add(self, name: str, duration: float, category: str,
+            price: Tuple[float, float], preferred_time: Optional[str] = None,
+            location: Optional[Tuple[float, float]] = None) -> 'ActivityView':
+        """Append an activity and return a view of its row."""
+        if self.size == len(self.duration):
+            self._grow()
+        row = self.size
+        self.duration[row] = duration
+        self.price_min[row] = price[0]
+        self.price_max[row] = price[1]
+        self.category_code[row] = self.category_code_for(category)
+        self.preferred_code[row] = TIMEBLOCKS.index(preferred_time) if preferred_time else -1
+        self.latitude[row], self.longitude[row] = location if location else (np.nan, np.nan)
+        self.names.append(name)
+        self.size += 1
+        return ActivityView(self, row)
+
+    def view(self, row: int) -> 'ActivityView':
+        return ActivityView(self, row)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def trip_stats(self, schedules: Sequence[Dict]) -> List[Dict]:
+        """
+        Vectorized equivalent of TripScheduler.calculate_trip_stats over many schedules.
+        Each result also has 'daily_hours': scheduled hours per day, in schedule order.
+        Views of this table are read from its columns; plain Activity objects are read
+        as they are now, so later edits to them are reflected and they are not kept.
+        """
+        trip_index, day_index, rows = [], [], []
+        plain: List[Activity] = []  # Activities outside the table, at the positions where rows is -1
+        days_per_trip = []
+        day_offset = 0
+        for trip, schedule in enumerate(schedules):
+            for day, day_schedule in enumerate(schedule.values()):
+                for activity in day_schedule.values():
+                    if activity:
+                        trip_index.append(trip)
+                        day_index.append(day_offset + day)
+                        if isinstance(activity, ActivityView) and activity.table is self:
+                            rows.append(activity.row)
+                        else:
+                            rows.append(-1)
+                            plain.append(activity)
+            days_per_trip.append(len(schedule))
+            day_offset += len(schedule)
+
+        trip_index = np.asarray(trip_index, dtype=np.int64)
+        day_index = np.asarray(day_index, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        is_plain = rows < 0
+        in_table = rows[~is_plain]
+
+        def column(values: np.ndarray, plain_values: List) -> np.ndarray:
+            gathered = np.empty(len(rows), dtype=values.dtype)
+            gathered[~is_plain] = values[in_table]
+            gathered[is_plain] = plain_values
+            return gathered
+
+        price_min = column(self.price_min, [activity.price[0] for activity in plain])
+        price_max = column(self.price_max, [activity.price[1] for activity in plain])
+        duration = column(self.duration, [activity.duration for activity in plain])
+        category_code = column(self.category_code, [self.category_code_for(activity.category) for activity in plain])
+
+        n_trips = len(schedules)
+        n_categories = len(self.categories)
+        counts = np.bincount(trip_index, minlength=n_trips)
+        cost_min = np.bincount(trip_index, weights=price_min, minlength=n_trips)
+        cost_max = np.bincount(trip_index, weights=price_max, minlength=n_trips)
+        histogram = np.bincount(
+            trip_index * n_categories + category_code,
+            minlength=n_trips * n_categories
+        ).reshape(n_trips, n_categories)
+        daily_hours = np.bincount(day_index, weights=duration, minlength=day_offset)
+        day_bounds = np.cumsum([0] + days_per_trip)
+
+        return [
+            {
+                'total_activities': int(counts[trip]),
+                'cost_range': (float(cost_min[trip]), float(cost_max[trip])),
+                'activities_by_category': {
+                    self.categories[code]: int(histogram[trip, code])
+                    for code in np.flatnonzero(histogram[trip])
+                },
+                'daily_hours': daily_hours[day_bounds[trip]:day_bounds[trip + 1]]
+            }
+            for trip in range(n_trips)
+        ]
+
+class ActivityView(Activity):
+    """An Activity backed by a row of an ActivityTable instead of its own fields."""
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table: ActivityTable, row: int):
+        self.table = table
+        self.row = row
+
+    @property
+    def name(self) -> str:
+        return self.table.names[self.row]
+
+    @property
+    def duration(self) -> float:
+        return float(self.table.duration[self.row])
+
+    @property
+    def category(self) -> str:
+        return self.table.categories[self.table.category_code[self.row]]
+
+    @property
+    def price(self) -> Tuple[float, float]:
+        return (float(self.table.price_min[self.row]), float(self.table.price_max[self.row]))
+
+    @property
+    def preferred_time(self) -> Optional[str]:
+        code = self.table.preferred_code[self.row]
+        return TIMEBLOCKS[code] if code >= 0 else None
+
+    @property
+    def location(self) -> Optional[Tuple[float, float]]:
+        latitude = self.table.latitude[self.row]
+        return None if np.isnan(latitude) else (float(latitude), float(self.table.longitude[self.row]))
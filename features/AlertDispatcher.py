@@ -0,0 +1,152 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple, Union
+from features.AlertManager import Alert, TripAlertManager
+
+AlertCallback = Callable[[Hashable, Alert], Union[None, Awaitable[None]]]
+
+logger = logging.getLogger("tripgenius.alerts")
+
+class _TripState:
+    def __init__(self, manager: TripAlertManager, fired_until: datetime):
+        self.manager = manager
+        self.fired_until = fired_until  # Alerts at or before this time have been delivered
+        self.version = 0                # Bumped on every reschedule; older heap entries are stale
+
+class AlertDispatcher:
+    def __init__(self, clock: Callable[[], datetime] = datetime.now):
+        """
+        Deliver due alerts for many trips from a single heap of next-due times.
+        Each trip has at most one live heap entry, so work per wake-up is
+        O(log trips) regardless of how many trips are registered.
+        Args:
+            clock: Source of the current time
+        """
+        self.clock = clock
+        self.callbacks: List[AlertCallback] = []
+        self._trips: Dict[Hashable, _TripState] = {}
+        self._heap: List[Tuple[datetime, int, Hashable, int]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopped = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add_callback(self, callback: AlertCallback):
+        """Register a function or coroutine function called as callback(trip_id, alert)."""
+        self.callbacks.append(callback)
+
+    def register(self, trip_id: Hashable, manager: TripAlertManager,
+                 fire_overdue: bool = False):
+        """
+        Start dispatching alerts for a trip.
+        Args:
+            trip_id: Identifier passed to callbacks
+            manager: The trip's alert manager
+            fire_overdue: Also deliver unacknowledged alerts that are already past due
+        """
+        fired_until = datetime.min if fire_overdue else self.clock()
+        self._trips[trip_id] = _TripState(manager, fired_until)
+        self._schedule(trip_id)
+
+    def unregister(self, trip_id: Hashable):
+        """Stop dispatching alerts for a trip; its heap entry is dropped lazily."""
+        self._trips.pop(trip_id, None)
+
+    def update(self, trip_id: Hashable):
+        """Reschedule a trip after its alerts were added or changed."""
+        if trip_id in self._trips:
+            self._schedule(trip_id)
+
+    def _schedule(self, trip_id: Hashable):
+        state = self._trips[trip_id]
+        state.version += 1
+        alert = state.manager.next_alert(state.fired_until)
+        if alert is not None:
+            heapq.heappush(self._heap, (alert.date, next(self._sequence), trip_id, state.version))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def next_due(self) -> Optional[datetime]:
+        """Time of the earliest pending alert across all trips."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap:
+            _, _, trip_id, version = self._heap[0]
+            state = self._trips.get(trip_id)
+            if state is not None and state.version == version:
+                return
+            heapq.heappop(self._heap)
+
+    def dispatch_due(self) -> List[Tuple[Hashable, Alert]]:
+        """
+        Deliver every alert that is due now.
+        Returns:
+            List of (trip_id, alert) pairs that were delivered
+        """
+        now = self.clock()
+        delivered = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, trip_id, version = heapq.heappop(self._heap)
+            state = self._trips.get(trip_id)
+            if state is None or state.version != version:
+                continue
+
+            # Acknowledged alerts are already out of the unacknowledged index
+            for alert in state.manager.get_alerts(start=state.fired_until, end=now, acknowledged=False):
+                if alert.date > state.fired_until:
+                    delivered.append((trip_id, alert))
+            state.fired_until = now
+            self._schedule(trip_id)
+            self._drop_stale()
+
+        for trip_id, alert in delivered:
+            self._deliver(trip_id, alert)
+        return delivered
+
+    def _deliver(self, trip_id: Hashable, alert: Alert):
+        # A failing callback is logged and skipped; the batch's alerts are already
+        # marked delivered, so letting it raise would drop them for every trip
+        for callback in self.callbacks:
+            try:
+                result = callback(trip_id, alert)
+            except Exception:
+                logger.exception("Alert callback %r failed for trip %r: %s", callback, trip_id, alert.title)
+                continue
+            if asyncio.iscoroutine(result):
+                task = asyncio.ensure_future(result)
+                self._tasks.add(task)
+                task.add_done_callback(lambda task, trip_id=trip_id, alert=alert: self._task_done(task, trip_id, alert))
+
+    def _task_done(self, task: asyncio.Task, trip_id: Hashable, alert: Alert):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Alert callback failed for trip %r: %s", trip_id, alert.title, exc_info=task.exception())
+
+    async def run(self):
+        """Sleep until the next alert is due, deliver it, repeat until stop() is called."""
+        self._wakeup = asyncio.Event()
+        self._stopped = False
+        try:
+            while not self._stopped:
+                self.dispatch_due()
+                due = self.next_due()
+                timeout = None if due is None else max(0.0, (due - self.clock()).total_seconds())
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._wakeup = None
+
+    def stop(self):
+        """Make run() return after its current wake-up."""
+        self._stopped = True
+        if self._wakeup is not None:
+            self._wakeup.set()
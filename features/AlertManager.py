@@ -1,6 +1,15 @@
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+from bisect import bisect_left, bisect_right
+import itertools
 import json
+import os
+
+if TYPE_CHECKING:
+    from features.Scheduling import ScheduleDiff
+
+# Hour of the reminder for an activity in each timeblock (1 hour before it starts)
+ACTIVITY_ALERT_HOURS = {'morning': 8, 'afternoon': 12, 'evening': 17}
 
 class Alert:
     def __init__(self, title: str, description: str, date: datetime, 
@@ -36,11 +45,168 @@ class Alert:
         alert.acknowledged = data['acknowledged']
         return alert
 
+class _AlertIndex:
+    """Alerts kept in (date, insertion order) order for O(log n) inserts and range queries."""
+    def __init__(self):
+        self.keys: List[Tuple[datetime, int]] = []
+        self.alerts: List[Alert] = []
+
+    def insert(self, key: Tuple[datetime, int], alert: Alert):
+        # Alerts mostly arrive in date order (bulk loads, generated schedules)
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.alerts.append(alert)
+            return
+        position = bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.alerts.insert(position, alert)
+
+    def remove(self, key: Tuple[datetime, int]):
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+            del self.alerts[position]
+
+    def range(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Alert]:
+        """Alerts with start <= date <= end (either bound may be open)."""
+        lo = 0 if start is None else bisect_left(self.keys, (start,))
+        hi = len(self.keys) if end is None else bisect_right(self.keys, (end, float('inf')))
+        return self.alerts[lo:hi]
+
+    def first_after(self, date: datetime) -> Optional[Alert]:
+        """The earliest alert strictly after `date`."""
+        position = bisect_right(self.keys, (date, float('inf')))
+        return self.alerts[position] if position < len(self.alerts) else None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+class AlertJournal:
+    """
+    Append-only JSON-lines log of alert changes.
+    
+    Record format (one JSON object per line):
+        {"op": "trip", "trip_start": ..., "trip_end": ...}
+        {"op": "add", "id": 0, "alert": {...Alert.to_dict()...}}
+        {"op": "ack", "id": 0}
+        {"op": "remove", "id": 0}
+    """
+    def __init__(self, filename: str, durable: bool = False, compact_ratio: float = 2.0,
+                 min_compact_records: int = 1024):
+        """
+        Args:
+            filename: Journal file, opened for appending
+            durable: fsync after every record instead of only flushing
+            compact_ratio: Compact once the log holds this many records per live alert
+            min_compact_records: Never compact logs shorter than this
+        """
+        self.filename = filename
+        self.durable = durable
+        self.compact_ratio = compact_ratio
+        self.min_compact_records = min_compact_records
+        self.records = 0
+        self._ids: Dict[int, int] = {}  # id(alert) -> record id
+        self._next_id = 0
+        self._file = open(filename, 'a')
+
+    @staticmethod
+    def scan(filename: str) -> Iterator[Tuple[Dict, int]]:
+        """
+        Stream the records of a journal with the byte offset just past each one,
+        stopping at a torn trailing write. The last offset is where the intact
+        part of the log ends.
+        """
+        offset = 0
+        with open(filename, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                offset += len(line)
+                yield record, offset
+
+    @staticmethod
+    def replay(filename: str) -> Iterator[Dict]:
+        """Stream the records of a journal, stopping at a torn trailing write."""
+        for record, _ in AlertJournal.scan(filename):
+            yield record
+
+    def truncate(self, length: int):
+        """
+        Cut the log back to its first `length` bytes, e.g. to drop a torn write before
+        appending; otherwise the next record would be glued onto the fragment and
+        every later replay would stop there.
+        """
+        self._file.flush()
+        os.truncate(self.filename, length)
+
+    def _write(self, record: Dict):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._file.flush()
+        if self.durable:
+            os.fsync(self._file.fileno())
+        self.records += 1
+
+    def track(self, alert: Alert, record_id: int):
+        """Associate an alert that was replayed from the log with its record id."""
+        self._ids[id(alert)] = record_id
+        self._next_id = max(self._next_id, record_id + 1)
+
+    def add(self, alert: Alert):
+        record_id = self._next_id
+        self.track(alert, record_id)
+        self._write({'op': 'add', 'id': record_id, 'alert': alert.to_dict()})
+
+    def acknowledge(self, alert: Alert):
+        record_id = self._ids.get(id(alert))
+        if record_id is not None:
+            self._write({'op': 'ack', 'id': record_id})
+
+    def remove(self, alert: Alert):
+        record_id = self._ids.pop(id(alert), None)
+        if record_id is not None:
+            self._write({'op': 'remove', 'id': record_id})
+
+    def needs_compaction(self, live_alerts: int) -> bool:
+        return self.records >= max(self.min_compact_records, self.compact_ratio * (live_alerts + 1))
+
+    def compact(self, trip_start: datetime, trip_end: datetime, alerts: List[Alert]):
+        """Rewrite the log as one record per alert, replacing the old file atomically."""
+        self._file.close()
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, 'w') as f:
+            f.write(json.dumps({
+                'op': 'trip',
+                'trip_start': trip_start.isoformat(),
+                'trip_end': trip_end.isoformat()
+            }, separators=(',', ':')) + '\n')
+            for record_id, alert in enumerate(alerts):
+                f.write(json.dumps(
+                    {'op': 'add', 'id': record_id, 'alert': alert.to_dict()},
+                    separators=(',', ':')
+                ) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, self.filename)
+
+        self._ids = {id(alert): record_id for record_id, alert in enumerate(alerts)}
+        self._next_id = len(alerts)
+        self.records = len(alerts) + 1
+        self._file = open(self.filename, 'a')
+
+    def close(self):
+        self._file.close()
+
 class TripAlertManager:
     def __init__(self, trip_start: datetime, trip_end: datetime):
         self.trip_start = trip_start
         self.trip_end = trip_end
-        self.alerts: List[Alert] = []
+        self._pending_journal: Optional[str] = None  # Journal not yet replayed into memory
+        self.alerts = []
+        self.journal: Optional[AlertJournal] = None
 
     def generate_trip_alerts(self, schedule: Dict, booking_info: Dict):
         """Generate all necessary alerts for the trip."""
@@ -85,69 +251,185 @@ class TripAlertManager:
     def _add_booking_deadline_alerts(self, booking_info: Dict):
         """Add alerts for booking deadlines."""
         for activity_name, info in booking_info.items():
-            # Assuming we want to book activities at least 2 weeks in advance
-            first_occurrence = datetime.fromisoformat(info['occurrences'][0]['date'])
-            booking_deadline = first_occurrence - timedelta(days=14)
-            
-            if booking_deadline > datetime.now():
-                self.add_alert(
-                    f"Book {activity_name}",
-                    f"Time to book {activity_name}! Price range: {info['price_range']}\n"
-                    f"Booking link: {info['booking_url']}",
-                    booking_deadline,
-                    "booking_deadline",
-                    "high"
-                )
+            self._add_booking_deadline_alert(activity_name, info)
+
+    def _add_booking_deadline_alert(self, activity_name: str, info: Dict) -> Optional[Alert]:
+        # Assuming we want to book activities at least 2 weeks in advance
+        first_occurrence = datetime.fromisoformat(info['occurrences'][0]['date'])
+        booking_deadline = first_occurrence - timedelta(days=14)
+
+        if booking_deadline > datetime.now():
+            return self.add_alert(
+                f"Book {activity_name}",
+                f"Time to book {activity_name}! Price range: {info['price_range']}\n"
+                f"Booking link: {info['booking_url']}",
+                booking_deadline,
+                "booking_deadline",
+                "high"
+            )
+        return None
 
     def _add_activity_alerts(self, schedule: Dict):
         """Add alerts for scheduled activities."""
         for date_str, day_schedule in schedule.items():
-            date = datetime.strptime(date_str, '%Y-%m-%d')
-            
             for timeblock, activity in day_schedule.items():
                 if activity:
-                    # Get the start time for the timeblock
-                    if timeblock == 'morning':
-                        alert_time = date.replace(hour=8)  # Alert 1 hour before
-                    elif timeblock == 'afternoon':
-                        alert_time = date.replace(hour=12)
-                    else:  # evening
-                        alert_time = date.replace(hour=17)
-
-                    self.add_alert(
-                        f"Upcoming: {activity.name}",
-                        f"Reminder: {activity.name} ({activity.duration} hours)\n"
-                        f"Category: {activity.category}\n"
-                        f"Price range: ${activity.price[0]}-${activity.price[1]}",
-                        alert_time,
-                        "activity",
-                        "normal"
-                    )
+                    self._add_activity_alert(date_str, timeblock, activity)
+
+    def _add_activity_alert(self, date_str: str, timeblock: str, activity) -> Alert:
+        date = datetime.strptime(date_str, '%Y-%m-%d')
+        # Get the start time for the timeblock (evening for anything unknown)
+        alert_time = date.replace(hour=ACTIVITY_ALERT_HOURS.get(timeblock, 17))
+
+        return self.add_alert(
+            f"Upcoming: {activity.name}",
+            f"Reminder: {activity.name} ({activity.duration} hours)\n"
+            f"Category: {activity.category}\n"
+            f"Price range: ${activity.price[0]}-${activity.price[1]}",
+            alert_time,
+            "activity",
+            "normal"
+        )
+
+    def update_trip_alerts(self, diff: 'ScheduleDiff', booking_info: Dict):
+        """
+        Apply a schedule diff to alerts from generate_trip_alerts.
+        Only the reminders of changed slots and the booking deadlines of activities
+        whose occurrences changed are replaced; acknowledged state elsewhere is kept.
+        Args:
+            diff: Changes returned by TripScheduler.add_activity/remove_activity
+            booking_info: Booking information already updated for the same diff
+        """
+        self._replay_pending_journal()
+        for date_str, timeblock, activity in diff.removed:
+            alert_time = datetime.strptime(date_str, '%Y-%m-%d').replace(
+                hour=ACTIVITY_ALERT_HOURS.get(timeblock, 17)
+            )
+            for alert in self.get_alerts(alert_time, alert_time, alert_type='activity'):
+                if alert.title == f"Upcoming: {activity.name}":
+                    self.remove_alert(alert)
+                    break
+
+        for date_str, timeblock, activity in diff.added:
+            self._add_activity_alert(date_str, timeblock, activity)
+
+        # Booking deadlines follow each activity's first occurrence, which may have moved
+        names = diff.activity_names
+        kept = set()
+        for alert in self._by_type.get('booking_deadline', _AlertIndex()).range():
+            name = alert.title[len("Book "):]
+            if name not in names:
+                continue
+            info = booking_info.get(name)
+            if info and alert.date == datetime.fromisoformat(info['occurrences'][0]['date']) - timedelta(days=14):
+                kept.add(name)
+            else:
+                self.remove_alert(alert)
+        for name in names - kept:
+            if name in booking_info:
+                self._add_booking_deadline_alert(name, booking_info[name])
+
+    @property
+    def alerts(self) -> List[Alert]:
+        """All alerts, ordered by date. Use add_alert/acknowledge_alert to change them."""
+        self._replay_pending_journal()
+        return self._index.alerts
+
+    @alerts.setter
+    def alerts(self, alerts: List[Alert]):
+        # Rebuild every index from scratch
+        self._pending_journal = None
+        self._index = _AlertIndex()
+        self._by_type: Dict[str, _AlertIndex] = {}
+        self._by_priority: Dict[str, _AlertIndex] = {}
+        self._by_acknowledged = {False: _AlertIndex(), True: _AlertIndex()}
+        self._keys: Dict[int, Tuple[datetime, int]] = {}
+        self._sequence = itertools.count()
+        for alert in sorted(alerts, key=lambda x: x.date):
+            self._index_alert(alert)
+
+    def _index_alert(self, alert: Alert):
+        """Insert an alert into the date index and every secondary index."""
+        self._replay_pending_journal()
+        key = (alert.date, next(self._sequence))
+        self._keys[id(alert)] = key
+        self._index.insert(key, alert)
+        self._by_type.setdefault(alert.alert_type, _AlertIndex()).insert(key, alert)
+        self._by_priority.setdefault(alert.priority, _AlertIndex()).insert(key, alert)
+        self._by_acknowledged[alert.acknowledged].insert(key, alert)
 
     def add_alert(self, title: str, description: str, date: datetime, 
                  alert_type: str, priority: str = "normal"):
         """Add a new alert."""
         alert = Alert(title, description, date, alert_type, priority)
-        self.alerts.append(alert)
-        self._sort_alerts()
+        self._index_alert(alert)
+        if self.journal:
+            self.journal.add(alert)
+        return alert
 
-    def _sort_alerts(self):
-        """Sort alerts by date."""
-        self.alerts.sort(key=lambda x: x.date)
+    def remove_alert(self, alert: Alert):
+        """Delete an alert from every index (and the journal)."""
+        self._replay_pending_journal()
+        key = self._keys.pop(id(alert), None)
+        if key is None:
+            return
+        self._index.remove(key)
+        self._by_type[alert.alert_type].remove(key)
+        self._by_priority[alert.priority].remove(key)
+        self._by_acknowledged[alert.acknowledged].remove(key)
+        if self.journal:
+            self.journal.remove(alert)
+            if self.journal.needs_compaction(len(self.alerts)):
+                self.compact_journal()
+
+    def get_alerts(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   alert_type: Optional[str] = None, priority: Optional[str] = None,
+                   acknowledged: Optional[bool] = None) -> List[Alert]:
+        """
+        Query alerts by time window and optional type, priority and acknowledged state.
+        The narrowest matching index is range-scanned, so unrelated alerts are never visited.
+        """
+        self._replay_pending_journal()
+        candidates = [self._index]
+        if alert_type is not None:
+            candidates.append(self._by_type.get(alert_type, _AlertIndex()))
+        if priority is not None:
+            candidates.append(self._by_priority.get(priority, _AlertIndex()))
+        if acknowledged is not None:
+            candidates.append(self._by_acknowledged[acknowledged])
+        index = min(candidates, key=len)
+
+        return [
+            alert for alert in index.range(start, end)
+            if (alert_type is None or alert.alert_type == alert_type)
+            and (priority is None or alert.priority == priority)
+            and (acknowledged is None or alert.acknowledged == acknowledged)
+        ]
 
     def get_upcoming_alerts(self, days: int = 7) -> List[Alert]:
         """Get alerts for the next X days."""
         current_date = datetime.now()
         end_date = current_date + timedelta(days=days)
         
-        return [
-            alert for alert in self.alerts
-            if current_date <= alert.date <= end_date
-            and not alert.acknowledged
-        ]
+        self._replay_pending_journal()
+        return self._by_acknowledged[False].range(current_date, end_date)
+
+    def next_alert(self, after: datetime) -> Optional[Alert]:
+        """Get the first unacknowledged alert strictly after a point in time."""
+        self._replay_pending_journal()
+        return self._by_acknowledged[False].first_after(after)
 
     def acknowledge_alert(self, alert: Alert):
         """Mark an alert as acknowledged."""
+        self._replay_pending_journal()
+        key = self._keys.get(id(alert))
+        if key is not None and not alert.acknowledged:
+            self._by_acknowledged[False].remove(key)
+            self._by_acknowledged[True].insert(key, alert)
+            if self.journal:
+                self.journal.acknowledge(alert)
+                if self.journal.needs_compaction(len(self.alerts)):
+                    self.compact_journal()
         alert.acknowledged = True
 
     def save_alerts(self, filename: str):
@@ -175,4 +457,68 @@ class TripAlertManager:
         )
         
         manager.alerts = [Alert.from_dict(alert_data) for alert_data in data['alerts']]
-        return manager
\ No newline at end of file
+        return manager
+
+    def attach_journal(self, filename: str, **journal_options):
+        """
+        Persist every later change to an append-only journal.
+        The journal starts as a snapshot of the current alerts.
+        """
+        self.journal = AlertJournal(filename, **journal_options)
+        self.compact_journal()
+
+    def compact_journal(self):
+        """Rewrite the journal as a snapshot of the current alerts."""
+        self.journal.compact(self.trip_start, self.trip_end, self.alerts)
+
+    def close_journal(self):
+        # Replay first so the alerts stay available after the journal is gone
+        self._replay_pending_journal()
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+
+    @classmethod
+    def open_journal(cls, filename: str, **journal_options) -> 'TripAlertManager':
+        """
+        Open a journal written by attach_journal and keep appending to it.
+        Only the trip record is read here; alerts are replayed on first use.
+        """
+        with open(filename, 'r') as f:
+            record = json.loads(f.readline() or '{}')
+        if record.get('op') != 'trip':
+            raise ValueError(f"No trip record at the start of alert journal: {filename}")
+
+        manager = cls(
+            trip_start=datetime.fromisoformat(record['trip_start']),
+            trip_end=datetime.fromisoformat(record['trip_end'])
+        )
+        manager.journal = AlertJournal(filename, **journal_options)
+        manager._pending_journal = filename
+        return manager
+
+    def _replay_pending_journal(self):
+        """Stream the journal into memory the first time alerts are needed."""
+        if self._pending_journal is None:
+            return
+        filename, self._pending_journal = self._pending_journal, None
+
+        alerts_by_id: Dict[int, Alert] = {}
+        records = 0
+        intact = 0
+        for record, intact in AlertJournal.scan(filename):
+            records += 1
+            if record['op'] == 'add':
+                alerts_by_id[record['id']] = Alert.from_dict(record['alert'])
+            elif record['op'] == 'ack' and record['id'] in alerts_by_id:
+                alerts_by_id[record['id']].acknowledged = True
+            elif record['op'] == 'remove':
+                alerts_by_id.pop(record['id'], None)
+
+        self.alerts = list(alerts_by_id.values())
+        for record_id, alert in alerts_by_id.items():
+            self.journal.track(alert, record_id)
+        self.journal.records = records
+        # Changes are only appended after this replay, so a torn tail can be cut off here
+        if intact < os.path.getsize(filename):
+            self.journal.truncate(intact)
@@ -0,0 +1,94 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import random
+from features.Scheduling import Activity, TripScheduler
+
+# (start_date, end_date, activities)
+ScheduleJob = Tuple[datetime, datetime, List[Activity]]
+
+def _job_seed(seed: int, job_index: int) -> int:
+    """Derive an independent, reproducible seed for each job."""
+    return random.Random(f"{seed}:{job_index}").getrandbits(64)
+
+def _run_job(payload: Tuple) -> Tuple[int, Dict, Dict]:
+    """
+    Worker entry point. Activities travel as plain tuples and come back as
+    positions in the job's activity list, so pickling stays small.
+    """
+    job_index, start_date, end_date, activity_rows, seed, optimal = payload
+    activities = [Activity(*row) for row in activity_rows]
+    positions = {id(activity): position for position, activity in enumerate(activities)}
+
+    scheduler = TripScheduler(start_date, end_date, seed=seed)
+    for activity in activities:
+        scheduler.add_activity(activity)
+
+    schedule = scheduler.generate_optimal_schedule() if optimal else scheduler.generate_schedule()
+    stats = scheduler.calculate_trip_stats(schedule)
+
+    compact = {
+        date: {
+            timeblock: positions[id(activity)] if activity else None
+            for timeblock, activity in day_schedule.items()
+        }
+        for date, day_schedule in schedule.items()
+    }
+    return job_index, compact, stats
+
+def _payloads(jobs: Iterable[ScheduleJob], seed: int, optimal: bool,
+              originals: Dict[int, List[Activity]]) -> Iterator[Tuple]:
+    for job_index, (start_date, end_date, activities) in enumerate(jobs):
+        activities = list(activities)
+        originals[job_index] = activities
+        activity_rows = [
+            (activity.name, activity.duration, activity.category,
+             tuple(activity.price), activity.preferred_time, activity.location)
+            for activity in activities
+        ]
+        yield job_index, start_date, end_date, activity_rows, _job_seed(seed, job_index), optimal
+
+def generate_schedules(jobs: Iterable[ScheduleJob], processes: Optional[int] = None,
+                       seed: int = 0, optimal: bool = False,
+                       chunksize: int = 16) -> Iterator[Tuple[int, Dict, Dict]]:
+    """
+    Generate schedules and trip statistics for many trips across worker processes.
+
+    Args:
+        jobs: (start_date, end_date, activities) tuples
+        processes: Number of worker processes (None = one per CPU, 1 = run in this process)
+        seed: Base seed; each job gets its own generator derived from it and its position
+        optimal: Use generate_optimal_schedule instead of the randomized greedy scheduler
+        chunksize: Jobs sent to a worker at a time
+
+    Yields:
+        (job_index, schedule, stats) in job order; schedules reference the
+        caller's own Activity objects
+    """
+    originals: Dict[int, List[Activity]] = {}
+    payloads = _payloads(jobs, seed, optimal, originals)
+
+    if processes == 1:
+        results = map(_run_job, payloads)
+        for result in _restore(results, originals):
+            yield result
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = executor.map(_run_job, payloads, chunksize=chunksize)
+        for result in _restore(results, originals):
+            yield result
+
+def _restore(results: Iterable[Tuple[int, Dict, Dict]],
+             originals: Dict[int, List[Activity]]) -> Iterator[Tuple[int, Dict, Dict]]:
+    """Swap activity positions back to the caller's Activity objects."""
+    for job_index, compact, stats in results:
+        activities = originals.pop(job_index)
+        schedule = {
+            date: {
+                timeblock: activities[position] if position is not None else None
+                for timeblock, position in day_schedule.items()
+            }
+            for date, day_schedule in compact.items()
+        }
+        yield job_index, schedule, stats
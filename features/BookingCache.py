@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from features.InferenceMetrics import InferenceMetrics, default_metrics
+
+class BookingURLCache:
+    def __init__(self, path: str = "booking_cache.sqlite3", ttl: float = 30 * 24 * 3600,
+                 max_entries: int = 100000, metrics: Optional[InferenceMetrics] = None):
+        """
+        Disk-backed cache of booking URLs shared by every worker process.
+        Args:
+            path: SQLite database file
+            ttl: Seconds before a cached URL expires
+            max_entries: Number of URLs kept before least recently used ones are evicted
+            metrics: Where lookups are reported (defaults to the process-wide one)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.metrics = metrics or default_metrics
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_eviction = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._connection().execute(
+            """CREATE TABLE IF NOT EXISTS booking_urls (
+                   key TEXT PRIMARY KEY,
+                   url TEXT NOT NULL,
+                   created REAL NOT NULL,
+                   last_access REAL NOT NULL
+               )"""
+        )
+        self._connection().execute(
+            "CREATE INDEX IF NOT EXISTS booking_urls_last_access ON booking_urls (last_access)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread and process; SQLite connections can't be shared."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # WAL lets readers in other processes proceed while one process writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def make_key(activity_name: str, destination: str) -> str:
+        """Normalize an (activity, destination) pair so trivial variations share an entry."""
+        def normalize(text: str) -> str:
+            return ' '.join(text.strip().strip('\'"').casefold().split())
+        return f"{normalize(activity_name)}|{normalize(destination)}"
+
+    def get(self, activity_name: str, destination: str) -> Optional[str]:
+        """Return the cached URL, or None if it is missing or expired."""
+        start = time.perf_counter()
+        url = self._get(activity_name, destination)
+        if self.metrics.hooks:
+            self.metrics.observe_cache_lookup('booking_urls', url is not None, time.perf_counter() - start)
+        return url
+
+    def _get(self, activity_name: str, destination: str) -> Optional[str]:
+        key = self.make_key(activity_name, destination)
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT url, created, last_access FROM booking_urls WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or now - row[1] > self.ttl:
+            with self._stats_lock:
+                self.misses += 1
+            return None
+
+        # Only touch the row once a minute so hot entries don't turn reads into writes
+        if now - row[2] > 60:
+            conn.execute("UPDATE booking_urls SET last_access = ? WHERE key = ?", (now, key))
+
+        with self._stats_lock:
+            self.hits += 1
+        return row[0]
+
+    def set(self, activity_name: str, destination: str, url: str):
+        """Store a URL for an (activity, destination) pair."""
+        key = self.make_key(activity_name, destination)
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO booking_urls (key, url, created, last_access) VALUES (?, ?, ?, ?)",
+            (key, url, now, now)
+        )
+
+        # Eviction scans the index, so only run it every so often
+        self._writes_since_eviction += 1
+        if self._writes_since_eviction >= 128:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop the least recently used entries beyond max_entries."""
+        self._writes_since_eviction = 0
+        cursor = self._connection().execute(
+            """DELETE FROM booking_urls WHERE key IN (
+                   SELECT key FROM booking_urls ORDER BY last_access DESC LIMIT -1 OFFSET ?
+               )""",
+            (self.max_entries,)
+        )
+        return cursor.rowcount
+
+    def purge_expired(self) -> int:
+        """Delete expired entries and return how many were removed."""
+        cursor = self._connection().execute(
+            "DELETE FROM booking_urls WHERE created < ?", (time.time() - self.ttl,)
+        )
+        return cursor.rowcount
+
+    def clear(self):
+        """Remove every cached URL."""
+        self._connection().execute("DELETE FROM booking_urls")
+
+    def stats(self) -> Dict:
+        """Report hit/miss counters for this process and the number of stored URLs."""
+        entries = self._connection().execute("SELECT COUNT(*) FROM booking_urls").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries
+        }
@@ -0,0 +1,152 @@
+import re
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    from features.ModelRegistry import ModelHandle, ModelRegistry
+
+# 'standard' is the original behaviour. Every other mode adds adaptive token budgets
+# and task-specific early stops; the last two also decode speculatively.
+DECODE_MODES = ('standard', 'early_stop', 'prompt_lookup', 'draft')
+
+# Days covered by the questionnaire's duration options; longer trips use the full budget
+_DURATION_DAYS = {'weekend': 2, '1 week': 7, '2 weeks': 14}
+_NUMBERED_LINE = re.compile(r'\s*\d+[.)]\s*\S+')
+
+def check_decode_mode(decode_mode: str, draft_model_path: Optional[str] = None):
+    if decode_mode not in DECODE_MODES:
+        raise ValueError(f"Unknown decode mode: {decode_mode} (expected one of {', '.join(DECODE_MODES)})")
+    if decode_mode == 'draft' and not draft_model_path:
+        raise ValueError("decode_mode='draft' needs a draft_model_path")
+
+def trip_days(answers: Dict) -> Optional[int]:
+    """Days in the trip from the questionnaire's duration answer, or None if open-ended."""
+    return _DURATION_DAYS.get(str(answers.get('duration', '')).strip().lower())
+
+def suggestion_token_budget(answers: Dict, limit: int = 2048) -> int:
+    """Prose budget: about 500 tokens of destination overview plus ~110 per trip day."""
+    days = trip_days(answers)
+    return limit if days is None else min(limit, 512 + 112 * days)
+
+def activity_target(answers: Dict, limit: int = 15) -> int:
+    """Activities worth generating: one per timeblock of the trip, capped at `limit`."""
+    days = trip_days(answers)
+    return limit if days is None else min(limit, 3 * days)
+
+class SmallModelDraft:
+    """
+    Draft model for llama.cpp speculative decoding backed by a small GGUF model.
+    The draft must share the main model's vocabulary (e.g. a 1B model of the same family).
+    """
+    def __init__(self, handle: 'ModelHandle', num_pred_tokens: int = 8):
+        """
+        Args:
+            handle: Registry handle on the draft model
+            num_pred_tokens: Tokens proposed per step; the main model verifies them in one batch
+        """
+        self.handle = handle
+        self.num_pred_tokens = num_pred_tokens
+
+    def __call__(self, input_ids, **kwargs):
+        import numpy as np
+
+        model = self.handle.model
+        predicted = []
+        with self.handle.lock:
+            # generate() keeps the KV state for the longest common prefix of the previous call
+            tokens = model.generate(input_ids.tolist(), temp=0.0, top_k=1, reset=True)
+            try:
+                for token in tokens:
+                    predicted.append(token)
+                    if len(predicted) >= self.num_pred_tokens:
+                        break
+            finally:
+                tokens.close()
+        return np.array(predicted, dtype=np.intc)
+
+    def release(self):
+        self.handle.release()
+
+class PromptLookupDraft:
+    """LlamaPromptLookupDecoding, imported on first use so constructing managers stays cheap."""
+    def __init__(self, max_ngram_size: int = 2, num_pred_tokens: int = 10):
+        self.max_ngram_size = max_ngram_size
+        self.num_pred_tokens = num_pred_tokens
+        self._draft = None
+
+    def __call__(self, input_ids, **kwargs):
+        if self._draft is None:
+            from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+            self._draft = LlamaPromptLookupDecoding(self.max_ngram_size, self.num_pred_tokens)
+        return self._draft(input_ids, **kwargs)
+
+def make_draft_model(decode_mode: str, registry: 'ModelRegistry',
+                     draft_model_path: Optional[str] = None, n_ctx: int = 2048):
+    """
+    Build the speculative draft for a decode mode (None for non-speculative modes).
+    Prompt lookup proposes continuations copied from the prompt, which suits booking
+    URLs and activity names that echo the prompt; 'draft' runs a small model.
+    """
+    check_decode_mode(decode_mode, draft_model_path)
+    if decode_mode == 'prompt_lookup':
+        return PromptLookupDraft()
+    if decode_mode == 'draft':
+        return SmallModelDraft(registry.acquire(draft_model_path, n_ctx=n_ctx))
+    return None
+
+def first_line_complete(text: str) -> bool:
+    """A non-blank line has been finished (leading blank lines are ignored)."""
+    return '\n' in text.lstrip()
+
+def numbered_lines_complete(count: int) -> Callable[[str], bool]:
+    """`count` finished "<number>. <item>" lines have been generated."""
+    def complete(text: str) -> bool:
+        finished = text[:text.rfind('\n') + 1]
+        return sum(1 for line in finished.split('\n') if _NUMBERED_LINE.match(line)) >= count
+    return complete
+
+class JSONArrayCounter:
+    """Counts the objects closed at the top level of a streamed JSON array."""
+    def __init__(self, target: int):
+        self.target = target
+        self.count = 0
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def __call__(self, text: str) -> bool:
+        for char in text[self._position:]:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '[{':
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+                if char == '}' and self._depth == 1:
+                    self.count += 1
+        self._position = len(text)
+        return self.count >= self.target
+
+def complete_until(handle: 'ModelHandle', prompt: str, is_complete: Callable[[str], bool],
+                   **kwargs) -> str:
+    """
+    Stream a completion and stop decoding as soon as `is_complete(text so far)` holds.
+    Closing the stream ends generation, so the remaining tokens are never decoded.
+    """
+    text = ''
+    stream = handle(prompt, stream=True, **kwargs)
+    try:
+        for chunk in stream:
+            text += chunk['choices'][0]['text']
+            if is_complete(text):
+                break
+    finally:
+        stream.close()
+    return text
@@ -0,0 +1,191 @@
+import json
+import threading
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import logging
+
+class LLMCall:
+    def __init__(self, model: str, operation: str, prompt_tokens: int, completion_tokens: int,
+                 queue_wait: float, total_time: float, time_to_first_token: Optional[float] = None,
+                 prefix_cache_hit: bool = False, prompt_tokens_reused: int = 0, streamed: bool = False,
+                 decode_mode: str = 'standard'):
+        """
+        Measurements for one completion.
+        Args:
+            model: Model file the completion ran on
+            operation: What the call was for, e.g. 'suggestions' or 'booking_url'
+            prompt_tokens: Tokens in the prompt
+            completion_tokens: Tokens generated
+            queue_wait: Seconds spent waiting for the model lock
+            total_time: Seconds from acquiring the model to the last token
+            time_to_first_token: Seconds to the first streamed token (streamed calls only)
+            prefix_cache_hit: Whether a saved prompt-prefix KV state was restored
+            prompt_tokens_reused: Prompt tokens served from the restored state
+            streamed: Whether the completion was streamed
+            decode_mode: Decoding strategy, e.g. 'standard' or 'prompt_lookup'
+        """
+        self.model = model
+        self.operation = operation
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.queue_wait = queue_wait
+        self.total_time = total_time
+        self.time_to_first_token = time_to_first_token
+        self.prefix_cache_hit = prefix_cache_hit
+        self.prompt_tokens_reused = prompt_tokens_reused
+        self.streamed = streamed
+        self.decode_mode = decode_mode
+
+    @property
+    def tokens_per_second(self) -> float:
+        """Generation speed; time to first token is excluded when known."""
+        decode_time = self.total_time - (self.time_to_first_token or 0.0)
+        return self.completion_tokens / decode_time if decode_time > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        data = dict(self.__dict__)
+        data['tokens_per_second'] = self.tokens_per_second
+        return data
+
+class MetricsHook:
+    """Base class for metrics sinks. Override the events you care about."""
+    def on_llm_call(self, call: LLMCall):
+        pass
+
+    def on_cache_lookup(self, cache: str, hit: bool, seconds: float):
+        pass
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SPEED_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+class PrometheusMetrics(MetricsHook):
+    def __init__(self, namespace: str = "tripgenius"):
+        """Aggregate counters and histograms and render them in Prometheus text format."""
+        self.namespace = namespace
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _inc(self, name: str, labels: Tuple, amount: float = 1.0):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def _observe(self, name: str, labels: Tuple, value: float, buckets: Tuple[float, ...]):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = _Histogram(buckets)
+        histogram.observe(value)
+
+    def on_llm_call(self, call: LLMCall):
+        labels = (('model', call.model), ('operation', call.operation), ('decode_mode', call.decode_mode))
+        with self._lock:
+            self._inc('llm_requests_total', labels)
+            self._inc('llm_prompt_tokens_total', labels, call.prompt_tokens)
+            self._inc('llm_completion_tokens_total', labels, call.completion_tokens)
+            self._inc('llm_prompt_tokens_reused_total', labels, call.prompt_tokens_reused)
+            if call.prefix_cache_hit:
+                self._inc('llm_prefix_cache_hits_total', labels)
+            self._observe('llm_request_seconds', labels, call.total_time, LATENCY_BUCKETS)
+            self._observe('llm_queue_wait_seconds', labels, call.queue_wait, LATENCY_BUCKETS)
+            if call.time_to_first_token is not None:
+                self._observe('llm_time_to_first_token_seconds', labels,
+                              call.time_to_first_token, LATENCY_BUCKETS)
+            if call.completion_tokens:
+                self._observe('llm_tokens_per_second', labels, call.tokens_per_second, SPEED_BUCKETS)
+
+    def on_cache_lookup(self, cache: str, hit: bool, seconds: float):
+        with self._lock:
+            self._inc('cache_lookups_total', (('cache', cache), ('result', 'hit' if hit else 'miss')))
+            self._observe('cache_lookup_seconds', (('cache', cache),), seconds, LATENCY_BUCKETS)
+
+    @staticmethod
+    def _labels(labels: Tuple, extra: Tuple = ()) -> str:
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = []
+        for key, value in pairs:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{key}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self) -> str:
+        """Current values in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                full_name = f"{self.namespace}_{name}"
+                if full_name not in seen:
+                    lines.append(f"# TYPE {full_name} counter")
+                    seen.add(full_name)
+                lines.append(f"{full_name}{self._labels(labels)} {value:g}")
+
+            for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                full_name = f"{self.namespace}_{name}"
+                if full_name not in seen:
+                    lines.append(f"# TYPE {full_name} histogram")
+                    seen.add(full_name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{self._labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{full_name}_bucket{self._labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{full_name}_sum{self._labels(labels)} {histogram.sum:g}")
+                lines.append(f"{full_name}_count{self._labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+class LoggingMetrics(MetricsHook):
+    def __init__(self, logger: Optional['logging.Logger'] = None, level: Optional[int] = None):
+        """Emit one structured JSON log line per LLM call and cache lookup (INFO by default)."""
+        # logging is only imported when this sink is used, keeping the package import fast
+        import logging
+        self.logger = logger or logging.getLogger("tripgenius.metrics")
+        self.level = logging.INFO if level is None else level
+
+    def on_llm_call(self, call: LLMCall):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, json.dumps({'event': 'llm_call', **call.to_dict()}))
+
+    def on_cache_lookup(self, cache: str, hit: bool, seconds: float):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, json.dumps({
+                'event': 'cache_lookup', 'cache': cache, 'hit': hit, 'seconds': seconds
+            }))
+
+class InferenceMetrics:
+    def __init__(self):
+        """Fan-out point for metrics events; does nothing until a hook is added."""
+        self.hooks: List[MetricsHook] = []
+
+    def add_hook(self, hook: MetricsHook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: MetricsHook):
+        self.hooks.remove(hook)
+
+    def observe_llm_call(self, call: LLMCall):
+        for hook in self.hooks:
+            hook.on_llm_call(call)
+
+    def observe_cache_lookup(self, cache: str, hit: bool, seconds: float):
+        for hook in self.hooks:
+            hook.on_cache_lookup(cache, hit, seconds)
+
+# Shared by the model registry and caches in the process
+default_metrics = InferenceMetrics()
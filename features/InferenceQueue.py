@@ -0,0 +1,195 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Hashable, List, Optional
+
+class QueueFullError(RuntimeError):
+    """Raised by submit(wait=False) when the queue is at capacity."""
+
+class _Request:
+    def __init__(self, client_id: Hashable, run: Optional[Callable[[threading.Event], Any]],
+                 payload: Any, batch_key: Optional[Hashable],
+                 run_batch: Optional[Callable[[List[Any], threading.Event], List[Any]]],
+                 cost: int, future: asyncio.Future):
+        self.client_id = client_id
+        self.run = run
+        self.payload = payload
+        self.batch_key = batch_key
+        self.run_batch = run_batch
+        self.cost = cost
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+class InferenceQueue:
+    def __init__(self, max_pending: int = 64, workers: int = 1, token_budget: int = 1536):
+        """
+        Asyncio front end that feeds blocking LLM work to a few worker threads.
+
+        Requests are taken round-robin across clients so one busy user can't
+        starve the others. Requests that share a batch_key are merged while
+        they wait, up to token_budget estimated tokens, and run as one
+        completion: each batch picks up whatever arrived while the previous
+        one was running.
+
+        Args:
+            max_pending: Requests allowed to wait before submit() applies backpressure
+            workers: Completions run concurrently (useful with several model replicas)
+            token_budget: Estimated tokens per merged batch; keep below the model's n_ctx
+        """
+        self.max_pending = max_pending
+        self.workers = workers
+        self.token_budget = token_budget
+        self.queue_waits: Deque[float] = deque(maxlen=1000)  # Seconds from submit to start
+        self._clients: 'OrderedDict[Hashable, Deque[_Request]]' = OrderedDict()
+        self._pending = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _start(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop the workers; requests still waiting are cancelled."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for requests in self._clients.values():
+            for request in requests:
+                request.future.cancel()
+        self._clients.clear()
+        self._pending = 0
+        self._tasks = []
+        self._condition = None
+
+    async def __aenter__(self) -> 'InferenceQueue':
+        self._start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def submit(self, run: Optional[Callable[[threading.Event], Any]] = None,
+                     client_id: Hashable = None, payload: Any = None,
+                     batch_key: Optional[Hashable] = None,
+                     run_batch: Optional[Callable[[List[Any], threading.Event], List[Any]]] = None,
+                     cost: int = 0, wait: bool = True) -> Any:
+        """
+        Queue blocking work and await its result.
+
+        Args:
+            run: Called in a worker thread with a threading.Event that is set if the
+                caller is cancelled; long generations should check it and stop early,
+                e.g. by raising concurrent.futures.CancelledError
+            client_id: Fairness key, e.g. a user or session id
+            payload: Item passed to run_batch for batchable requests
+            batch_key: Requests with equal keys may be merged into one run_batch call
+            run_batch: Called with the merged payloads and the cancel event; returns
+                one result per payload, in order
+            cost: Estimated tokens this request adds to a merged batch
+            wait: Await room in the queue instead of raising QueueFullError
+        """
+        self._start()
+        async with self._condition:
+            if self._pending >= self.max_pending:
+                if not wait:
+                    raise QueueFullError(f"{self._pending} requests already pending")
+                await self._condition.wait_for(lambda: self._pending < self.max_pending)
+
+            future = asyncio.get_running_loop().create_future()
+            request = _Request(client_id, run, payload, batch_key, run_batch, cost, future)
+            self._clients.setdefault(client_id, deque()).append(request)
+            self._pending += 1
+            self._condition.notify_all()
+
+        # Cancelling the awaiting task cancels the future; workers skip it or signal the run
+        return await future
+
+    def _next_batch(self) -> List[_Request]:
+        """Pop the next request round-robin, plus compatible requests that fit the budget."""
+        while self._clients:
+            client_id, requests = next(iter(self._clients.items()))
+            self._clients.move_to_end(client_id)
+            request = requests.popleft()
+            if not requests:
+                del self._clients[client_id]
+            self._pending -= 1
+            if not request.future.cancelled():
+                break
+        else:
+            return []
+
+        batch = [request]
+        if request.batch_key is None:
+            return batch
+
+        budget = self.token_budget - request.cost
+        filled = True
+        # Keep visiting clients in turn so merged slots are shared fairly too
+        while filled and budget > 0:
+            filled = False
+            for client_id in list(self._clients):
+                requests = self._clients[client_id]
+                for candidate in requests:
+                    if candidate.batch_key == request.batch_key and candidate.cost <= budget:
+                        requests.remove(candidate)
+                        self._pending -= 1
+                        if not candidate.future.cancelled():
+                            batch.append(candidate)
+                            budget -= candidate.cost
+                        filled = True
+                        break
+                if not requests:
+                    del self._clients[client_id]
+        return batch
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._pending > 0)
+                batch = self._next_batch()
+                self._condition.notify_all()  # Room for submitters waiting on backpressure
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for request in batch:
+                self.queue_waits.append(started - request.enqueued)
+
+            cancelled = threading.Event()
+            for request in batch:
+                request.future.add_done_callback(
+                    lambda _, batch=batch: cancelled.set()
+                    if all(member.future.cancelled() for member in batch) else None
+                )
+
+            first = batch[0]
+            if first.batch_key is None:
+                work = loop.run_in_executor(None, first.run, cancelled)
+            else:
+                payloads = [request.payload for request in batch]
+                work = loop.run_in_executor(None, first.run_batch, payloads, cancelled)
+            try:
+                results = await work
+            except (asyncio.CancelledError, concurrent.futures.CancelledError):
+                if work.cancelled():
+                    raise  # close() is stopping this worker
+                # The run gave up because its callers went away; only this batch fails
+                for request in batch:
+                    request.future.cancel()
+                continue
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            if first.batch_key is None:
+                results = [results]
+
+            for request, result in zip(batch, results):
+                if not request.future.done():
+                    request.future.set_result(result)
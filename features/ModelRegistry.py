@@ -0,0 +1,431 @@
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional, Tuple
+from features.InferenceMetrics import InferenceMetrics, LLMCall, default_metrics
+
+if TYPE_CHECKING:
+    from llama_cpp import Llama
+
+def _resident_memory_bytes() -> int:
+    """Return the resident set size of the current process in bytes."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Non-Linux platforms: fall back to the peak RSS reported by getrusage
+        try:
+            import resource
+            import sys
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == 'darwin' else peak * 1024
+        except ImportError:
+            return 0
+
+class _ModelLock:
+    """
+    Non-reentrant lock on a shared model. A thread that already holds it, e.g. while
+    consuming a stream, gets a RuntimeError instead of running another completion
+    on the model mid-generation, which would corrupt the stream's KV state.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owner: Optional[int] = None
+
+    def acquire(self):
+        if self._owner == threading.get_ident():
+            raise RuntimeError("Model is already in use on this thread; finish or close its stream first")
+        self._lock.acquire()
+        self._owner = threading.get_ident()
+
+    def release(self):
+        self._owner = None
+        self._lock.release()
+
+    def __enter__(self) -> '_ModelLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+class _ModelEntry:
+    def __init__(self, model_path: str, load_kwargs: Dict, model_factory: Optional[Callable] = None):
+        self.model_path = model_path
+        self.load_kwargs = load_kwargs
+        self.model_factory = model_factory  # Defaults to llama_cpp.Llama
+        self.llm: Optional['Llama'] = None
+        self.lock = _ModelLock()  # Serializes every use of the shared Llama instance
+        self.refcount = 0
+        self.load_count = 0
+        self.load_time = 0.0    # seconds spent in the last load
+        self.memory_bytes = 0   # RSS growth observed during the last load
+        self.prefix_states: Dict[str, Tuple] = {}  # prompt prefix -> (KV state, prefix tokens)
+        self.prefix_hits = 0
+        self.prompt_tokens = 0
+        self.prompt_tokens_reused = 0
+        self.loading = False
+        self.load_error: Optional[BaseException] = None  # From the last failed load
+
+    def satisfies(self, n_ctx: int, logits_all: bool) -> bool:
+        return n_ctx <= self.load_kwargs['n_ctx'] and (not logits_all or self.load_kwargs.get('logits_all', False))
+
+    def ensure_loaded(self, n_ctx: int, logits_all: bool = False):
+        """
+        Load the model on first use, or reload it if `n_ctx` outgrows the current context
+        or a speculative handle needs logits for every token.
+        """
+        with self.lock:
+            if self.llm is not None and self.satisfies(n_ctx, logits_all):
+                return
+            # Both are fixed at load time, so grow them once for everyone
+            self.load_kwargs['n_ctx'] = max(n_ctx, self.load_kwargs['n_ctx'])
+            if logits_all:
+                self.load_kwargs['logits_all'] = True
+            self.load()
+
+    def load(self):
+        """Load (or reload) the model with the current load settings."""
+        self.llm = None  # Drop the old weights before mapping new ones
+        self.prefix_states = {}  # Saved KV states belong to the old context
+        rss_before = _resident_memory_bytes()
+        model_factory = self.model_factory
+        if model_factory is None:
+            from llama_cpp import Llama
+            model_factory = Llama
+        start = time.perf_counter()
+        self.loading = True
+        try:
+            self.llm = model_factory(model_path=self.model_path, **self.load_kwargs)
+            self.load_error = None
+        except Exception as e:
+            self.load_error = e
+            raise
+        finally:
+            self.loading = False
+        self.load_time = time.perf_counter() - start
+        self.memory_bytes = max(0, _resident_memory_bytes() - rss_before)
+        self.load_count += 1
+
+class ModelHandle:
+    def __init__(self, registry: 'ModelRegistry', entry: _ModelEntry,
+                 n_ctx: int, sampling: Dict, draft_model=None):
+        """
+        A reference-counted view of a shared model.
+        Args:
+            registry: Registry that owns the model
+            entry: Shared model entry
+            n_ctx: Context size this handle was acquired with
+            sampling: Default completion settings (temperature, top_p, ...)
+            draft_model: Speculative decoding draft (a llama_cpp LlamaDraftModel) used
+                for this handle's completions only
+        """
+        self._registry = registry
+        self._entry = entry
+        self.n_ctx = n_ctx
+        self.sampling = sampling
+        self.draft_model = draft_model
+        self.released = False
+
+    @property
+    def model(self) -> 'Llama':
+        """The underlying Llama instance, loaded on first access. Hold `lock` while using it directly."""
+        self.load()
+        return self._entry.llm
+
+    @property
+    def lock(self) -> _ModelLock:
+        return self._entry.lock
+
+    @property
+    def ready(self) -> bool:
+        """Whether a call would run without loading the model first."""
+        entry = self._entry
+        return entry.llm is not None and not entry.loading and entry.satisfies(self.n_ctx, self.draft_model is not None)
+
+    def load(self):
+        """Load the model now instead of on the first completion."""
+        if self.released:
+            raise RuntimeError(f"Handle for {self._entry.model_path} has been released")
+        if not self.ready:
+            self._entry.ensure_loaded(self.n_ctx, self.draft_model is not None)
+
+    def warm_up(self) -> threading.Thread:
+        """
+        Load the model on a background thread so the first request doesn't pay for it.
+        Completions issued meanwhile wait for the load. A failed load is recorded in
+        the registry stats and retried by the next completion.
+        Returns:
+            threading.Thread: The loading thread; join() it to wait
+        """
+        def load():
+            try:
+                self.load()
+            except Exception:
+                pass  # Kept in entry.load_error
+
+        thread = threading.Thread(target=load, name=f"warm-up {self._entry.model_path}", daemon=True)
+        thread.start()
+        return thread
+
+    def __call__(self, prompt: str, cached_prefix: Optional[str] = None,
+                 operation: str = 'completion', decode_mode: str = 'standard', **kwargs):
+        """
+        Run a completion with this handle's sampling defaults.
+        Args:
+            prompt: Full prompt text
+            cached_prefix: Static leading part of the prompt whose KV state is
+                evaluated once and restored on later calls
+            operation: Label for metrics, e.g. 'suggestions' or 'booking_url'
+            decode_mode: Label for metrics, so decoding strategies can be compared
+            **kwargs: Completion settings overriding the handle defaults
+        """
+        if self.released:
+            raise RuntimeError(f"Handle for {self._entry.model_path} has been released")
+        if cached_prefix is not None and not prompt.startswith(cached_prefix):
+            raise ValueError("Prompt does not start with the cached prefix")
+
+        settings = dict(self.sampling)
+        settings.update(kwargs)
+        self.load()
+
+        if settings.get('stream'):
+            return self._stream(prompt, cached_prefix, operation, decode_mode, settings)
+
+        queued = time.perf_counter()
+        with self._entry.lock:
+            started = time.perf_counter()
+            # The model is shared, so put this handle's draft (or none) in place every time
+            self._entry.llm.draft_model = self.draft_model
+            prefix_hit, reused = self._restore_prefix(cached_prefix, prompt) if cached_prefix else (False, 0)
+            response = self._entry.llm(prompt, **settings)
+            finished = time.perf_counter()
+
+        if self._registry.metrics.hooks:
+            usage = response.get('usage') or {}
+            self._registry.metrics.observe_llm_call(LLMCall(
+                model=self._entry.model_path,
+                operation=operation,
+                decode_mode=decode_mode,
+                prompt_tokens=usage.get('prompt_tokens', 0),
+                completion_tokens=usage.get('completion_tokens', 0),
+                queue_wait=started - queued,
+                total_time=finished - started,
+                prefix_cache_hit=prefix_hit,
+                prompt_tokens_reused=reused
+            ))
+        return response
+
+    def _stream(self, prompt: str, cached_prefix: Optional[str], operation: str,
+                decode_mode: str, settings: Dict) -> Iterator[Dict]:
+        queued = time.perf_counter()
+        first_token = None
+        chunks = 0
+        # Keep the model locked until the stream is exhausted or closed; other threads wait,
+        # and completions on the consuming thread raise instead of interleaving with it
+        with self._entry.lock:
+            started = time.perf_counter()
+            self._entry.llm.draft_model = self.draft_model
+            prefix_hit, reused = self._restore_prefix(cached_prefix, prompt) if cached_prefix else (False, 0)
+            try:
+                for chunk in self._entry.llm(prompt, **settings):
+                    if chunk['choices'][0]['text']:
+                        # llama.cpp streams one chunk per generated token
+                        chunks += 1
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                    yield chunk
+            finally:
+                finished = time.perf_counter()
+                if self._registry.metrics.hooks:
+                    self._registry.metrics.observe_llm_call(LLMCall(
+                        model=self._entry.model_path,
+                        operation=operation,
+                        decode_mode=decode_mode,
+                        prompt_tokens=len(self._entry.llm.tokenize(prompt.encode('utf-8'))),
+                        completion_tokens=chunks,
+                        queue_wait=started - queued,
+                        total_time=finished - started,
+                        time_to_first_token=first_token,
+                        prefix_cache_hit=prefix_hit,
+                        prompt_tokens_reused=reused,
+                        streamed=True
+                    ))
+
+    def _restore_prefix(self, prefix: str, prompt: str) -> Tuple[bool, int]:
+        """
+        Put the model's KV cache in the state left by evaluating `prefix`.
+        Llama skips the tokens it already holds, so only the suffix is evaluated.
+        Must be called with the entry lock held.
+        Returns:
+            Tuple[bool, int]: Whether a saved state was restored, and the prompt tokens it covers
+        """
+        entry = self._entry
+        model = entry.llm
+
+        prompt_tokens = model.tokenize(prompt.encode('utf-8'))
+        entry.prompt_tokens += len(prompt_tokens)
+
+        cached = entry.prefix_states.get(prefix)
+        if cached is None:
+            model.reset()
+            prefix_tokens = model.tokenize(prefix.encode('utf-8'))
+            model.eval(prefix_tokens)
+            entry.prefix_states[prefix] = (model.save_state(), prefix_tokens)
+            return False, 0
+
+        model.load_state(cached[0])
+        entry.prefix_hits += 1
+
+        # Tokenization may merge across the boundary, so count the real overlap
+        reused = 0
+        for cached_token, prompt_token in zip(cached[1], prompt_tokens):
+            if cached_token != prompt_token:
+                break
+            reused += 1
+        entry.prompt_tokens_reused += reused
+        return True, reused
+
+    def release(self):
+        """Give the handle back to the registry."""
+        if not self.released:
+            self.released = True
+            self._registry._release(self._entry)
+
+    def __enter__(self) -> 'ModelHandle':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+class ModelRegistry:
+    def __init__(self, model_factory: Optional[Callable] = None,
+                 metrics: Optional[InferenceMetrics] = None):
+        """
+        Process-wide cache of loaded GGUF models, one instance per model file.
+        Args:
+            model_factory: Callable taking model_path and load settings and returning a
+                Llama-compatible model (defaults to llama_cpp.Llama)
+            metrics: Where every completion is reported (defaults to the process-wide one)
+        """
+        self.model_factory = model_factory
+        self.metrics = metrics or default_metrics
+        self._entries: Dict[str, _ModelEntry] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model_path: str) -> str:
+        return os.path.abspath(model_path)
+
+    def acquire(self, model_path: str, n_ctx: int = 2048, n_batch: int = 512,
+                n_threads: int = 4, draft_model=None, **sampling) -> ModelHandle:
+        """
+        Get a shared handle to a model. Nothing is loaded until the handle is first
+        used or warmed up, so acquiring is cheap.
+        Args:
+            model_path: Path to the GGUF model file
+            n_ctx: Context size needed by the caller
+            n_batch: Prompt evaluation batch size
+            n_threads: Number of CPU threads
+            draft_model: Optional speculative decoding draft for this handle. The shared
+                model is then loaded with logits_all, which speculative decoding needs
+            **sampling: Default completion settings for this handle
+        Returns:
+            ModelHandle: Callable handle; call release() when done
+        """
+        key = self._key(model_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _ModelEntry(model_path, {
+                    'n_ctx': n_ctx,
+                    'n_batch': n_batch,
+                    'n_threads': n_threads
+                }, self.model_factory)
+                self._entries[key] = entry
+            elif entry.llm is None and not entry.loading:
+                # Not loaded yet, so the first load can use the largest context requested
+                entry.load_kwargs['n_ctx'] = max(n_ctx, entry.load_kwargs['n_ctx'])
+                if draft_model is not None:
+                    entry.load_kwargs['logits_all'] = True
+            entry.refcount += 1
+
+        return ModelHandle(self, entry, n_ctx, sampling, draft_model)
+
+    def _release(self, entry: _ModelEntry):
+        with self._lock:
+            entry.refcount = max(0, entry.refcount - 1)
+
+    def unload(self, model_path: str, force: bool = False) -> bool:
+        """
+        Free a model's weights.
+        Args:
+            model_path: Path the model was acquired with
+            force: Unload even if handles are still held
+        Returns:
+            bool: True if the model was unloaded
+        """
+        key = self._key(model_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry.refcount > 0 and not force):
+                return False
+            del self._entries[key]
+
+        with entry.lock:
+            entry.llm = None
+        return True
+
+    def unload_unused(self) -> int:
+        """Unload every model that has no outstanding handles."""
+        with self._lock:
+            unused = [entry.model_path for entry in self._entries.values() if entry.refcount == 0]
+        return sum(1 for model_path in unused if self.unload(model_path))
+
+    def warm_up(self) -> Dict[str, threading.Thread]:
+        """Start loading, in the background, every model that has been acquired but not loaded."""
+        with self._lock:
+            pending = [entry for entry in self._entries.values() if entry.llm is None and entry.refcount > 0]
+        threads = {}
+        for entry in pending:
+            handle = ModelHandle(self, entry, entry.load_kwargs['n_ctx'], {})
+            threads[entry.model_path] = handle.warm_up()
+        return threads
+
+    def ready(self, model_path: Optional[str] = None) -> bool:
+        """
+        Readiness probe: True once the given model, or every acquired model, is loaded.
+        Cheap enough to call from a health-check endpoint.
+        """
+        with self._lock:
+            if model_path is not None:
+                entry = self._entries.get(self._key(model_path))
+                entries = [entry] if entry is not None else []
+            else:
+                entries = [entry for entry in self._entries.values() if entry.refcount > 0]
+            return bool(entries) and all(entry.llm is not None and not entry.loading for entry in entries)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Report load time, memory and reference counts for each model."""
+        with self._lock:
+            return {
+                key: {
+                    'loaded': entry.llm is not None,
+                    'loading': entry.loading,
+                    'load_error': repr(entry.load_error) if entry.load_error else None,
+                    'refcount': entry.refcount,
+                    'load_count': entry.load_count,
+                    'load_time': entry.load_time,
+                    'memory_bytes': entry.memory_bytes,
+                    'n_ctx': entry.load_kwargs['n_ctx'],
+                    'prefix_states': len(entry.prefix_states),
+                    'prefix_hits': entry.prefix_hits,
+                    'prompt_tokens': entry.prompt_tokens,
+                    'prompt_tokens_reused': entry.prompt_tokens_reused
+                }
+                for key, entry in self._entries.items()
+            }
+
+# Shared by every manager in the process
+default_registry = ModelRegistry()
@@ -1,28 +1,110 @@
-from typing import Dict, Optional
-from llama_cpp import Llama
+from typing import TYPE_CHECKING, Dict, Hashable, List, Optional, Tuple
 from datetime import datetime
+import re
+import threading
+import time
+from features.FastDecode import (
+    check_decode_mode, complete_until, first_line_complete, make_draft_model,
+    numbered_lines_complete
+)
+from features.ModelRegistry import ModelRegistry, default_registry
+from features.StructuredOutput import get_grammar
+
+if TYPE_CHECKING:
+    from features.BookingCache import BookingURLCache
+    from features.InferenceQueue import InferenceQueue
+    from features.Scheduling import ScheduleDiff
+
+TIMEBLOCK_ORDER = {'morning': 0, 'afternoon': 1, 'evening': 2}
+_NUMBERED_LINE = re.compile(r'\s*(\d+)[.)]')
+_URL = re.compile(r'https?://\S+')
+
+# Static part of the booking prompt; its KV state is evaluated once and reused
+BOOKING_PROMPT_PREFIX = """Give the URL of the webpage where I could most certainly buy tickets or make a reservation for the activity below.
+
+Consider official websites, major booking platforms (like Viator, GetYourGuide, etc.), or local tour operators.
+Only return a single, most reliable URL. If you're not completely sure about the specific URL, suggest the main booking platform's search page for this destination.
+"""
 
 class ReservationManager:
-    def __init__(self, model_path: str = "llama-2-13b-chat.gguf"):
-        """Initialize the Reservation Manager with Llama model."""
-        self.llm = Llama(
-            model_path=model_path,
+    def __init__(self, model_path: str = "llama-2-13b-chat.gguf",
+                 registry: Optional[ModelRegistry] = None,
+                 cache: Optional['BookingURLCache'] = None,
+                 reuse_prompt_prefix: bool = True,
+                 structured_output: bool = False,
+                 decode_mode: str = 'standard',
+                 draft_model_path: Optional[str] = None):
+        """
+        Initialize the Reservation Manager with a shared Llama model.
+        The model is loaded by the first lookup that misses the cache; call
+        warm_up() to load it sooner.
+        With structured_output, a grammar restricts completions to bare URLs.
+        A decode_mode other than 'standard' stops each completion at the end of
+        the URL line(s) and, for 'prompt_lookup'/'draft', decodes speculatively
+        (see features.FastDecode).
+        """
+        check_decode_mode(decode_mode, draft_model_path)
+        self.registry = registry or default_registry
+        self.decode_mode = decode_mode
+        self.draft_model = make_draft_model(decode_mode, self.registry, draft_model_path)
+        self.cached_prefix = BOOKING_PROMPT_PREFIX if reuse_prompt_prefix else None
+        self.cache = cache  # Optional persistent URL cache shared across workers
+        self.structured_output = structured_output
+        self.llm = self.registry.acquire(
+            model_path,
             n_ctx=2048,
             n_batch=512,
-            n_threads=4
+            n_threads=4,
+            draft_model=self.draft_model
         )
-        
+
+    def close(self):
+        """Release this manager's handle on the shared model."""
+        self.llm.release()
+        if hasattr(self.draft_model, 'release'):
+            self.draft_model.release()
+
+    def _complete(self, prompt: str, is_complete, **kwargs) -> str:
+        """Run a completion, stopping at `is_complete` unless decoding in standard mode."""
+        if self.decode_mode == 'standard':
+            return self.llm(prompt, **kwargs)['choices'][0]['text']
+        return complete_until(self.llm, prompt, is_complete, decode_mode=self.decode_mode, **kwargs)
+
+    def warm_up(self) -> threading.Thread:
+        """Load the model in the background; join() the returned thread to wait."""
+        return self.llm.warm_up()
+
+    @property
+    def ready(self) -> bool:
+        """Whether the model is loaded and lookups won't wait for it."""
+        return self.llm.ready
+
     def _get_booking_url(self, activity_name: str, destination: str) -> str:
         """
         Get booking URL suggestion from Llama for a specific activity.
         """
-        prompt = f"""Give the URL of the webpage where I could most certainly buy tickets or make a reservation for this activity: '{activity_name}' in {destination}. 
-        
-Consider official websites, major booking platforms (like Viator, GetYourGuide, etc.), or local tour operators.
-Only return a single, most reliable URL. If you're not completely sure about the specific URL, suggest the main booking platform's search page for this destination."""
+        prompt = BOOKING_PROMPT_PREFIX + f"""
+Activity: '{activity_name}'
+Destination: {destination}"""
 
-        response = self.llm(
+        if self.structured_output:
+            return self._complete(
+                prompt,
+                first_line_complete,
+                operation='booking_url',
+                cached_prefix=self.cached_prefix,
+                grammar=get_grammar('url'),
+                max_tokens=60,
+                temperature=0.3,
+                top_p=0.95,
+                repeat_penalty=1.1
+            ).strip()
+
+        response_text = self._complete(
             prompt,
+            first_line_complete,
+            operation='booking_url',
+            cached_prefix=self.cached_prefix,
             max_tokens=100,
             temperature=0.3,  # Lower temperature for more focused responses
             top_p=0.95,
@@ -30,44 +112,294 @@ Only return a single, most reliable URL. If you're not completely sure about the
         )
         
         # Extract URL from response
-        response_text = response['choices'][0]['text'].strip()
+        response_text = response_text.strip()
         # Basic URL extraction - you might want to add more sophisticated URL validation
         if 'http' in response_text:
             url = response_text.split('\n')[0].strip()
             return url
         return response_text
 
-    def get_booking_information(self, schedule: Dict, destination: str) -> Dict:
+    def _get_booking_urls(self, activity_names: List[str], destination: str) -> List[str]:
+        """
+        Get booking URL suggestions for several activities with a single completion.
+        Activities the model skips are looked up one at a time.
+        """
+        numbered = '\n'.join(f"{i}. {name}" for i, name in enumerate(activity_names, 1))
+        prompt = f"""Give the URL of the webpage where I could most certainly buy tickets or make a reservation for each of these activities in {destination}:
+{numbered}
+
+Consider official websites, major booking platforms (like Viator, GetYourGuide, etc.), or local tour operators.
+Answer with exactly one line per activity, in the same order, formatted as "<number>. <URL>". If you're not completely sure about the specific URL, suggest the main booking platform's search page for this destination."""
+
+        if self.structured_output:
+            structured = {'grammar': get_grammar('numbered_urls')}
+        else:
+            structured = {}
+
+        text = self._complete(
+            prompt,
+            numbered_lines_complete(len(activity_names)),
+            operation='booking_urls',
+            max_tokens=60 * len(activity_names),
+            **structured,
+            temperature=0.3,
+            top_p=0.95,
+            repeat_penalty=1.1
+        )
+
+        # Take the URL from each numbered line, wherever the model put it on the line;
+        # numbered lines without a URL are looked up on their own below
+        urls = {}
+        for line in text.split('\n'):
+            number = _NUMBERED_LINE.match(line)
+            url = _URL.search(line)
+            if number and url:
+                urls.setdefault(int(number.group(1)), url.group(0).rstrip('.,;'))
+
+        return [
+            urls.get(i) or self._get_booking_url(name, destination)
+            for i, name in enumerate(activity_names, 1)
+        ]
+
+    def _resolve_batch(self, batch: List[str], destination: str) -> List[Tuple[str, float]]:
+        """
+        Ask the model for a batch of booking URLs and store them in the cache.
+        Returns (URL, seconds) per activity; a batched completion's time is shared evenly.
+        """
+        start = time.perf_counter()
+        if len(batch) == 1:
+            urls = [self._get_booking_url(batch[0], destination)]
+        else:
+            urls = self._get_booking_urls(batch, destination)
+        latency = (time.perf_counter() - start) / len(batch)
+        for name, url in zip(batch, urls):
+            # Refusals and other non-URL answers are returned but not kept for the TTL
+            if self.cache is not None and _URL.match(url):
+                self.cache.set(name, destination, url)
+        return [(url, latency) for url in urls]
+
+    def _cached_urls(self, activity_names: List[str], destination: str,
+                     latencies: Dict[str, float]) -> Dict[str, str]:
+        """Serve what we can from the cache so only the rest goes to the model."""
+        booking_urls = {}
+        if self.cache is not None:
+            for name in activity_names:
+                start = time.perf_counter()
+                url = self.cache.get(name, destination)
+                if url is not None:
+                    booking_urls[name] = url
+                    latencies[name] = time.perf_counter() - start
+        return booking_urls
+
+    def resolve_booking_urls(self, activity_names: List[str], destination: str,
+                             batch_size: int = 1, max_workers: int = 1,
+                             latencies: Optional[Dict[str, float]] = None) -> Dict[str, str]:
+        """
+        Resolve booking URLs for many activities in one pass.
+        
+        Args:
+            activity_names: Unique activity names to look up
+            destination: The trip destination
+            batch_size: Activities per completion (1 keeps one prompt per activity)
+            max_workers: Number of lookups in flight at once. Completions on one shared
+                model run one at a time, so this only helps when lookups are served by
+                several model replicas; on a single model, raise batch_size instead
+            latencies: Filled with the seconds each activity took in this call,
+                cache hits included
+            
+        Returns:
+            Dictionary mapping each activity name to its booking URL
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be at least 1, got {max_workers}")
+
+        if latencies is None:
+            latencies = {}
+
+        def resolve(batch: List[str]) -> Dict[str, str]:
+            resolved = {}
+            for name, (url, latency) in zip(batch, self._resolve_batch(batch, destination)):
+                resolved[name] = url
+                latencies[name] = latency
+            return resolved
+
+        booking_urls = self._cached_urls(activity_names, destination, latencies)
+        activity_names = [name for name in activity_names if name not in booking_urls]
+
+        batches = [
+            activity_names[i:i + batch_size]
+            for i in range(0, len(activity_names), batch_size)
+        ]
+
+        if max_workers > 1 and len(batches) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for result in executor.map(resolve, batches):
+                    booking_urls.update(result)
+        else:
+            for batch in batches:
+                booking_urls.update(resolve(batch))
+
+        return booking_urls
+
+    def get_booking_information(self, schedule: Dict, destination: str,
+                                batch_size: int = 1, max_workers: int = 1,
+                                latencies: Optional[Dict[str, float]] = None) -> Dict:
         """
         Generate booking information for all activities in the schedule.
         
         Args:
             schedule: The schedule dictionary from TripScheduler
             destination: The trip destination
+            batch_size: Activities resolved per completion
+            max_workers: Number of lookups in flight at once (see resolve_booking_urls)
+            latencies: Filled with the seconds each activity's lookup took
             
         Returns:
             Dictionary with booking information for each activity
         """
+        # Collect unique activities first so every URL is resolved in one pass
+        unique_activities = self._unique_activities(schedule)
+        booking_urls = self.resolve_booking_urls(
+            list(unique_activities), destination,
+            batch_size=batch_size, max_workers=max_workers, latencies=latencies
+        )
+        return self._build_booking_info(schedule, unique_activities, booking_urls)
+
+    async def aget_booking_information(self, schedule: Dict, destination: str,
+                                       queue: 'InferenceQueue', client_id: Hashable = None,
+                                       latencies: Optional[Dict[str, float]] = None) -> Dict:
+        """
+        Async variant of get_booking_information that shares the model through a queue.
+
+        Each uncached activity is queued on its own; the queue merges lookups for the
+        same destination, from this and other concurrent callers, into batch prompts.
+
+        Args:
+            schedule: The schedule dictionary from TripScheduler
+            destination: The trip destination
+            queue: Inference queue shared by all concurrent users
+            client_id: Fairness key for this user or session
+            latencies: Filled with the seconds each activity's lookup took
+
+        Returns:
+            Dictionary with booking information for each activity
+        """
+        import asyncio
+
+        if latencies is None:
+            latencies = {}
+        unique_activities = self._unique_activities(schedule)
+        booking_urls = self._cached_urls(list(unique_activities), destination, latencies)
+        missing = [name for name in unique_activities if name not in booking_urls]
+
+        # Each request gets back its own (URL, seconds), even when merged with other callers'
+        results = await asyncio.gather(*(
+            queue.submit(
+                client_id=client_id,
+                payload=name,
+                batch_key=(id(self), destination),
+                run_batch=lambda batch, cancelled: self._resolve_batch(batch, destination),
+                # Prompt line plus the URL line it gets back
+                cost=len(name) // 4 + 60
+            )
+            for name in missing
+        ))
+        for name, (url, latency) in zip(missing, results):
+            booking_urls[name] = url
+            latencies[name] = latency
+        return self._build_booking_info(schedule, unique_activities, booking_urls)
+
+    def update_booking_information(self, booking_info: Dict, diff: 'ScheduleDiff',
+                                   destination: str, batch_size: int = 1,
+                                   max_workers: int = 1,
+                                   latencies: Optional[Dict[str, float]] = None) -> Dict:
+        """
+        Apply a schedule diff to booking information from get_booking_information.
+        Only activities new to the schedule are looked up; everything else is
+        patched in place.
+
+        Args:
+            booking_info: Booking information to update in place
+            diff: Changes returned by TripScheduler.add_activity/remove_activity
+            destination: The trip destination
+            batch_size: Activities resolved per completion
+            max_workers: Number of lookups in flight at once (see resolve_booking_urls)
+            latencies: Filled with the seconds each new activity's lookup took
+
+        Returns:
+            The updated booking_info
+        """
+        # Only names missing before the diff need a lookup; an activity that just
+        # moved between slots keeps its entry even if the diff removes it first
+        new_activities = {}
+        for date, timeblock, activity in diff.added:
+            if activity.name not in booking_info:
+                new_activities.setdefault(activity.name, activity)
+
+        booking_urls = self.resolve_booking_urls(
+            list(new_activities), destination,
+            batch_size=batch_size, max_workers=max_workers, latencies=latencies
+        )
+        for name, activity in new_activities.items():
+            booking_info[name] = self._booking_entry(activity, booking_urls[name])
+
+        touched = set()
+        for date, timeblock, activity in diff.removed:
+            info = booking_info.get(activity.name)
+            if info is None:
+                continue
+            info['occurrences'] = [
+                occurrence for occurrence in info['occurrences']
+                if (occurrence['date'], occurrence['timeblock']) != (date, timeblock)
+            ]
+            touched.add(activity.name)
+        for date, timeblock, activity in diff.added:
+            booking_info[activity.name]['occurrences'].append({'date': date, 'timeblock': timeblock})
+            touched.add(activity.name)
+
+        for name in touched:
+            if not booking_info[name]['occurrences']:
+                del booking_info[name]
+                continue
+            # Keep occurrences in schedule order; alerts use the first one as the booking deadline
+            booking_info[name]['occurrences'].sort(
+                key=lambda occurrence: (occurrence['date'], TIMEBLOCK_ORDER.get(occurrence['timeblock'], 3))
+            )
+        return booking_info
+
+    @staticmethod
+    def _booking_entry(activity, booking_url: str) -> Dict:
+        return {
+            'booking_url': booking_url,
+            'price_range': f"${activity.price[0]}-${activity.price[1]}",
+            'duration': f"{activity.duration} hours",
+            'category': activity.category,
+            'preferred_time': activity.preferred_time or 'Flexible',
+            'occurrences': []  # Will store all date/time occurrences
+        }
+
+    @staticmethod
+    def _unique_activities(schedule: Dict) -> Dict:
+        unique_activities = {}
+        for day_schedule in schedule.values():
+            for activity in day_schedule.values():
+                if activity and activity.name not in unique_activities:
+                    unique_activities[activity.name] = activity
+        return unique_activities
+
+    @staticmethod
+    def _build_booking_info(schedule: Dict, unique_activities: Dict,
+                            booking_urls: Dict[str, str]) -> Dict:
         booking_info = {}
-        processed_activities = set()  # To avoid duplicate lookups
-        
-        # Process each day in the schedule
+        for name, activity in unique_activities.items():
+            booking_info[name] = ReservationManager._booking_entry(activity, booking_urls[name])
+
+        # Add occurrence information
         for date, day_schedule in schedule.items():
             for timeblock, activity in day_schedule.items():
-                if activity and activity.name not in processed_activities:
-                    booking_url = self._get_booking_url(activity.name, destination)
-                    
-                    booking_info[activity.name] = {
-                        'booking_url': booking_url,
-                        'price_range': f"${activity.price[0]}-${activity.price[1]}",
-                        'duration': f"{activity.duration} hours",
-                        'category': activity.category,
-                        'preferred_time': activity.preferred_time or 'Flexible',
-                        'occurrences': []  # Will store all date/time occurrences
-                    }
-                    processed_activities.add(activity.name)
-                
-                # Add occurrence information
                 if activity:
                     booking_info[activity.name]['occurrences'].append({
                         'date': date,
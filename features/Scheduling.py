@@ -1,30 +1,181 @@
 from datetime import datetime, timedelta
+from bisect import insort
+from collections import deque
+from itertools import combinations, permutations
 import random
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, FrozenSet, Iterator, Optional, Set, Tuple
 
 class Activity:
+    __slots__ = ('name', 'duration', 'category', 'price', 'preferred_time', 'location')
+
     def __init__(self, name: str, duration: float, category: str, 
-                 price: Tuple[float, float], preferred_time: str = None):
+                 price: Tuple[float, float], preferred_time: str = None,
+                 location: Optional[Tuple[float, float]] = None):
         self.name = name
         self.duration = duration  # in hours
         self.category = category
         self.price = price  # (min_price, max_price)
         self.preferred_time = preferred_time  # 'morning', 'afternoon', 'evening', or None
+        self.location = location  # (latitude, longitude), or None if unknown
+
+class ScheduleDiff:
+    """Slots whose activity changed, as {(date, timeblock): (old activity, new activity)}."""
+    def __init__(self):
+        self.changes: Dict[Tuple[str, str], Tuple[Optional[Activity], Optional[Activity]]] = {}
+
+    def record(self, date: str, timeblock: str, old: Optional[Activity], new: Optional[Activity]):
+        """Note a slot change, folding it into any earlier change of the same slot."""
+        key = (date, timeblock)
+        if key in self.changes:
+            old = self.changes[key][0]
+        if old is new:
+            self.changes.pop(key, None)
+        else:
+            self.changes[key] = (old, new)
+
+    def merge(self, other: 'ScheduleDiff') -> 'ScheduleDiff':
+        """Fold a later diff into this one, so several edits can be applied downstream at once."""
+        for (date, timeblock), (old, new) in other.changes.items():
+            self.record(date, timeblock, old, new)
+        return self
+
+    @property
+    def removed(self) -> Iterator[Tuple[str, str, Activity]]:
+        """(date, timeblock, activity) for every activity taken out of a slot."""
+        return ((date, timeblock, old) for (date, timeblock), (old, _) in self.changes.items() if old)
+
+    @property
+    def added(self) -> Iterator[Tuple[str, str, Activity]]:
+        """(date, timeblock, activity) for every activity put into a slot."""
+        return ((date, timeblock, new) for (date, timeblock), (_, new) in self.changes.items() if new)
+
+    @property
+    def activity_names(self) -> Set[str]:
+        """Names of the activities whose occurrences changed."""
+        return {activity.name for pair in self.changes.values() for activity in pair if activity}
+
+    def __bool__(self) -> bool:
+        return bool(self.changes)
+
+    def __len__(self) -> int:
+        return len(self.changes)
 
 class TripScheduler:
-    def __init__(self, start_date: datetime, end_date: datetime):
+    def __init__(self, start_date: datetime, end_date: datetime, seed: Optional[int] = None):
         self.start_date = start_date
         self.end_date = end_date
+        # A seeded generator makes generate_schedule reproducible; otherwise use the global one
+        self.rng = random.Random(seed) if seed is not None else random
         self.activities = []
         self.daily_schedule = {
             'morning': (9, 12),    # 9 AM to 12 PM
             'afternoon': (13, 17), # 1 PM to 5 PM
             'evening': (18, 22)    # 6 PM to 10 PM
         }
+        self.schedule: Optional[Dict] = None  # Live schedule patched by add/remove_activity
 
-    def add_activity(self, activity: Activity):
-        """Add an activity to the pool of selected activities."""
+    def add_activity(self, activity: Activity) -> Optional[ScheduleDiff]:
+        """
+        Add an activity to the pool of selected activities.
+        In incremental mode it is also placed in the earliest free slot it fits, and
+        the change to the live schedule is returned.
+        """
         self.activities.append(activity)
+        if self.schedule is None:
+            return None
+
+        diff = ScheduleDiff()
+        slot = self._earliest_free_slot(activity)
+        if slot is None:
+            # Full for this activity, like generate_schedule; it waits for a slot to free up
+            self._waiting.setdefault(activity.preferred_time, {})[id(activity)] = activity
+        else:
+            self._place(slot[0], slot[1], activity, diff)
+        return diff
+
+    def remove_activity(self, activity: Activity) -> Optional[ScheduleDiff]:
+        """
+        Remove an activity from the pool.
+        In incremental mode its slot is backfilled from the activities still waiting
+        for one, and the change to the live schedule is returned.
+        """
+        self.activities.remove(activity)
+        if self.schedule is None:
+            return None
+
+        diff = ScheduleDiff()
+        slot = self._placed.pop(id(activity), None)
+        if slot is None:
+            self._waiting.get(activity.preferred_time, {}).pop(id(activity), None)
+            return diff
+
+        date, timeblock = slot
+        self.schedule[date][timeblock] = None
+        diff.record(date, timeblock, activity, None)
+        replacement = self._next_waiting(timeblock)
+        if replacement is None:
+            insort(self._free[timeblock], date)
+        else:
+            self._place(date, timeblock, replacement, diff, free=False)
+        return diff
+
+    def start_incremental(self, schedule: Optional[Dict] = None) -> Dict:
+        """
+        Switch to incremental mode around a live schedule.
+        From now on add_activity/remove_activity patch only the slots they affect
+        and return a ScheduleDiff instead of requiring a new schedule.
+        Args:
+            schedule: Schedule to adopt (generated with generate_schedule if omitted)
+        Returns:
+            The live schedule, which later edits update in place
+        """
+        self.schedule = schedule if schedule is not None else self.generate_schedule()
+        self._placed: Dict[int, Tuple[str, str]] = {}
+        self._free: Dict[str, List[str]] = {timeblock: [] for timeblock in self.daily_schedule}
+        for date in sorted(self.schedule):
+            for timeblock, activity in self.schedule[date].items():
+                if activity is None:
+                    self._free[timeblock].append(date)
+                else:
+                    self._placed[id(activity)] = (date, timeblock)
+        # Unplaced activities by preferred time, in pool order
+        self._waiting: Dict[Optional[str], Dict[int, Activity]] = {}
+        for activity in self.activities:
+            if id(activity) not in self._placed:
+                self._waiting.setdefault(activity.preferred_time, {})[id(activity)] = activity
+        return self.schedule
+
+    def stop_incremental(self):
+        """Leave incremental mode; add/remove_activity only edit the pool again."""
+        self.schedule = None
+
+    def _earliest_free_slot(self, activity: Activity) -> Optional[Tuple[str, str]]:
+        best = None
+        for position, timeblock in enumerate(self.daily_schedule):
+            free = self._free[timeblock]
+            if free and self._can_fit_in_timeblock(activity, timeblock):
+                if best is None or (free[0], position) < best[0]:
+                    best = ((free[0], position), timeblock)
+        return (best[0][0], best[1]) if best else None
+
+    def _place(self, date: str, timeblock: str, activity: Activity, diff: ScheduleDiff,
+               free: bool = True):
+        if free:
+            self._free[timeblock].remove(date)  # Dates are few per timeblock
+        self.schedule[date][timeblock] = activity
+        self._placed[id(activity)] = (date, timeblock)
+        diff.record(date, timeblock, None, activity)
+
+    def _next_waiting(self, timeblock: str) -> Optional[Activity]:
+        """Take the first waiting activity for a freed timeblock, preferring ones that asked for it."""
+        for preferred_time in (timeblock, None):
+            waiting = self._waiting.get(preferred_time)
+            if waiting:
+                for key, activity in waiting.items():
+                    if self._can_fit_in_timeblock(activity, timeblock):
+                        del waiting[key]
+                        return activity
+        return None
 
     def _can_fit_in_timeblock(self, activity: Activity, timeblock: str) -> bool:
         """Check if an activity can fit in a given timeblock."""
@@ -65,7 +216,7 @@ class TripScheduler:
                         if activity.preferred_time == timeblock
                     ]
                     
-                    selected_activity = random.choice(
+                    selected_activity = self.rng.choice(
                         preferred_activities if preferred_activities else suitable_activities
                     )
                     
@@ -76,6 +227,304 @@ class TripScheduler:
             
         return schedule
 
+    def _candidate_buckets(self) -> Dict[FrozenSet[str], List[Activity]]:
+        """Group activities by the set of timeblocks they can fit in (at most 2^3 buckets)."""
+        buckets: Dict[FrozenSet[str], List[Activity]] = {}
+        for activity in self.activities:
+            blocks = frozenset(
+                timeblock for timeblock in self.daily_schedule
+                if self._can_fit_in_timeblock(activity, timeblock)
+            )
+            if blocks:
+                buckets.setdefault(blocks, []).append(activity)
+        return buckets
+
+    @staticmethod
+    def _assign_buckets(counts: Dict[FrozenSet[str], int], capacity: int) -> Dict[Tuple[FrozenSet[str], str], int]:
+        """
+        Max-flow from activity buckets to timeblocks, each timeblock holding `capacity` activities.
+        Returns the number of activities of each bucket placed in each timeblock.
+        """
+        flow: Dict[Tuple[FrozenSet[str], str], int] = {}
+        block_load: Dict[str, int] = {}
+        remaining = dict(counts)
+
+        while True:
+            # BFS over the residual graph: source -> bucket -> block (-> bucket via undo) -> sink
+            parents: Dict = {bucket: None for bucket, count in remaining.items() if count > 0}
+            queue = deque(parents)
+            sink_block = None
+            while queue and sink_block is None:
+                bucket = queue.popleft()
+                for block in bucket:
+                    if block in parents:
+                        continue
+                    parents[block] = bucket
+                    if block_load.get(block, 0) < capacity:
+                        sink_block = block
+                        break
+                    for other in counts:
+                        if other not in parents and flow.get((other, block), 0) > 0:
+                            parents[other] = block
+                            queue.append(other)
+
+            if sink_block is None:
+                return flow
+
+            # Push one activity along the path (bucket counts are small, so unit steps are fine)
+            block_load[sink_block] = block_load.get(sink_block, 0) + 1
+            block = sink_block
+            while True:
+                bucket = parents[block]
+                flow[(bucket, block)] = flow.get((bucket, block), 0) + 1
+                previous_block = parents[bucket]
+                if previous_block is None:
+                    remaining[bucket] -= 1
+                    break
+                flow[(bucket, previous_block)] -= 1
+                block = previous_block
+
+    def generate_optimal_schedule(self, max_budget: Optional[float] = None) -> Dict:
+        """
+        Generate a deterministic schedule placing as many activities as possible.
+        
+        Args:
+            max_budget: Optional cap on the total of the activities' maximum prices
+            
+        Returns:
+            Schedule in the same format as generate_schedule
+        """
+        trip_duration = (self.end_date - self.start_date).days + 1
+        timeblocks = list(self.daily_schedule.keys())
+        buckets = self._candidate_buckets()
+        bucket_of = {id(activity): bucket for bucket, members in buckets.items() for activity in members}
+
+        # Cheapest first (stable on insertion order). Sets of activities that can be placed
+        # form a matroid, so greedy selection gives the most activities within the budget.
+        candidates = [activity for activity in self.activities if id(activity) in bucket_of]
+        if max_budget is not None:
+            candidates.sort(key=lambda activity: activity.price[1])
+
+        # Hall's condition: activities confined to any set of timeblocks must fit in their slots
+        block_sets = [frozenset(subset) for size in range(1, len(timeblocks) + 1)
+                      for subset in combinations(timeblocks, size)]
+        confined = {block_set: 0 for block_set in block_sets}
+
+        selected: Dict[FrozenSet[str], List[Activity]] = {}
+        total_cost = 0
+        for activity in candidates:
+            if max_budget is not None and total_cost + activity.price[1] > max_budget:
+                break
+            bucket = bucket_of[id(activity)]
+            affected = [block_set for block_set in block_sets if bucket <= block_set]
+            if any(confined[block_set] + 1 > len(block_set) * trip_duration for block_set in affected):
+                continue
+            for block_set in affected:
+                confined[block_set] += 1
+            selected.setdefault(bucket, []).append(activity)
+            total_cost += activity.price[1]
+
+        flow = self._assign_buckets(
+            {bucket: len(members) for bucket, members in selected.items()}, trip_duration
+        )
+
+        # Fill each timeblock day by day, preferred-time activities first
+        by_block: Dict[str, List[Activity]] = {timeblock: [] for timeblock in timeblocks}
+        for bucket, members in selected.items():
+            members = iter(members)
+            for timeblock in sorted(bucket, key=timeblocks.index):
+                for _ in range(flow.get((bucket, timeblock), 0)):
+                    by_block[timeblock].append(next(members))
+        for timeblock, assigned in by_block.items():
+            assigned.sort(key=lambda activity: activity.preferred_time != timeblock)
+
+        schedule = {}
+        for day_num in range(trip_duration):
+            current_date = self.start_date + timedelta(days=day_num)
+            schedule[current_date.strftime('%Y-%m-%d')] = {
+                timeblock: by_block[timeblock][day_num] if day_num < len(by_block[timeblock]) else None
+                for timeblock in timeblocks
+            }
+
+        return schedule
+
+    def _best_day_order(self, members: List[Activity], points: Dict[int, Tuple[float, float]],
+                        accept: Optional[Callable[[Dict[str, Activity]], bool]] = None) -> Optional[Dict[str, Activity]]:
+        """
+        Assign a day's activities to timeblocks so the walk morning -> evening is shortest.
+        Activities without a point don't count towards the walk. A day holds at most
+        one activity per timeblock, so every order is tried; `accept` can rule orders out.
+        Returns None if the activities can't share a day.
+        """
+        from features.SpatialIndex import path_length
+
+        best = None
+        for blocks in permutations(self.daily_schedule, len(members)):
+            if not all(self._can_fit_in_timeblock(activity, block) for activity, block in zip(members, blocks)):
+                continue
+            ordered = dict(sorted(zip(blocks, members), key=lambda pair: list(self.daily_schedule).index(pair[0])))
+            if accept is not None and not accept(ordered):
+                continue
+            length = path_length([points[id(activity)] for activity in ordered.values() if id(activity) in points])
+            if best is None or length < best[0]:
+                best = (length, ordered)
+        return best[1] if best else None
+
+    def generate_route_schedule(self, start_location: Optional[Tuple[float, float]] = None) -> Dict:
+        """
+        Generate a schedule that keeps each day's activities close together.
+
+        Activities are picked by walking nearest-neighbour from `start_location` through
+        a spatial grid index, so large catalogs are never compared all against all. The
+        walk is shortened with 2-opt and cut into days, and each day's activities are
+        put in the timeblock order with the shortest route. Activities without a
+        location are admitted after the walk under the same placement check, so the
+        schedule holds as many activities as generate_optimal_schedule.
+
+        Args:
+            start_location: (latitude, longitude) to start from, e.g. the hotel
+                (defaults to the first located activity)
+
+        Returns:
+            Schedule in the same format as generate_schedule
+        """
+        # Imported here so Scheduling stays importable on its own (see output-to-activity.py)
+        from features.SpatialIndex import GridIndex, LocalProjection, two_opt
+
+        trip_duration = (self.end_date - self.start_date).days + 1
+        timeblocks = list(self.daily_schedule.keys())
+        buckets = self._candidate_buckets()
+        bucket_of = {id(activity): bucket for bucket, members in buckets.items() for activity in members}
+
+        # Hall's condition keeps the picked activities placeable, as in generate_optimal_schedule.
+        # Any maximal set admitted this way is also a largest one, whatever the order.
+        block_sets = [frozenset(subset) for size in range(1, len(timeblocks) + 1)
+                      for subset in combinations(timeblocks, size)]
+        confined = {block_set: 0 for block_set in block_sets}
+
+        def admit(bucket: FrozenSet[str]) -> bool:
+            affected = [block_set for block_set in block_sets if bucket <= block_set]
+            if any(confined[block_set] + 1 > len(block_set) * trip_duration for block_set in affected):
+                return False
+            for block_set in affected:
+                confined[block_set] += 1
+            return True
+
+        located = {bucket: [activity for activity in members if activity.location is not None]
+                   for bucket, members in buckets.items()}
+        points: Dict[int, Tuple[float, float]] = {}
+        route: List[Activity] = []
+        first = next((activity for members in located.values() for activity in members), None)
+        if first is not None:
+            origin = start_location or first.location
+            project = LocalProjection(origin[0])
+            points = {id(activity): project(activity.location)
+                      for members in located.values() for activity in members}
+            by_id = {id(activity): activity for members in located.values() for activity in members}
+            indexes = {bucket: GridIndex({id(activity): points[id(activity)] for activity in members})
+                       for bucket, members in located.items() if members}
+
+            position = project(origin)
+            walk: List[int] = []
+            while indexes and len(walk) < trip_duration * len(timeblocks):
+                best = None
+                for bucket, index in indexes.items():
+                    hit = index.nearest(*position)
+                    if hit is not None and (best is None or hit[1] < best[2]):
+                        best = (bucket, hit[0], hit[1])
+                if best is None:
+                    break
+                bucket, item, _ = best
+                indexes[bucket].remove(item)
+                if not admit(bucket):
+                    # Counts only grow, so nothing else from this bucket fits either
+                    del indexes[bucket]
+                    continue
+                walk.append(item)
+                position = points[item]
+
+            # 2-opt over the walk, anchored at the start location
+            route_points = [project(origin)] + [points[item] for item in walk]
+            order = two_opt(route_points, list(range(len(route_points))), fixed_start=True)
+            route = [by_id[walk[index - 1]] for index in order if index > 0]
+
+        unlocated = [activity for activity in self.activities
+                     if activity.location is None and id(activity) in bucket_of
+                     and admit(bucket_of[id(activity)])]
+
+        # Cut the route into consecutive runs, one per day: a day takes the next activity
+        # along the route while everything not yet placed still fits the remaining slots
+        # (Hall's condition again, with today's free timeblocks open to unlocated activities
+        # only). Unlocated activities then fill the free timeblocks the same way.
+        located_left: Dict[FrozenSet[str], int] = {}
+        for activity in route:
+            located_left[bucket_of[id(activity)]] = located_left.get(bucket_of[id(activity)], 0) + 1
+        unlocated_left: Dict[FrozenSet[str], int] = {}
+        for activity in unlocated:
+            unlocated_left[bucket_of[id(activity)]] = unlocated_left.get(bucket_of[id(activity)], 0) + 1
+
+        def fits(located: Dict[FrozenSet[str], int], pending: Dict[FrozenSet[str], int],
+                 free: List[str], later_days: int, located_today: bool) -> bool:
+            capacity = {timeblock: later_days for timeblock in timeblocks}
+            capacity.update({('today', timeblock): 1 for timeblock in free})
+            demand: Dict[FrozenSet, int] = {}
+            for counts, today in ((located, located_today), (pending, True)):
+                for bucket, count in counts.items():
+                    if count:
+                        key = bucket | {('today', timeblock) for timeblock in free if timeblock in bucket} if today else bucket
+                        demand[key] = demand.get(key, 0) + count
+            slots = list(capacity)
+            return all(
+                sum(count for key, count in demand.items() if key <= subset) <= sum(capacity[slot] for slot in subset)
+                for size in range(1, len(slots) + 1) for subset in map(frozenset, combinations(slots, size))
+            )
+
+        def leaves_room(group: List[Activity], later_days: int, located_today: bool):
+            rest = dict(located_left)
+            for activity in group:
+                rest[bucket_of[id(activity)]] -= 1
+            return lambda day: fits(rest, unlocated_left, [timeblock for timeblock in timeblocks if timeblock not in day],
+                                    later_days, located_today)
+
+        waiting = list(route)
+        schedule = {}
+        for day_num in range(trip_duration):
+            later_days = trip_duration - day_num - 1
+            group: List[Activity] = []
+            for activity in list(waiting):
+                if len(group) == len(timeblocks):
+                    break
+                # Could the day still be completed with this activity in it?
+                if self._best_day_order(group + [activity], points, leaves_room(group + [activity], later_days, True)):
+                    group.append(activity)
+                    waiting.remove(activity)
+                elif self._best_day_order(group, points, leaves_room(group, later_days, False)) is not None:
+                    break  # The day is complete; skipping ahead would split up the route
+            day_schedule = {timeblock: None for timeblock in timeblocks}
+            if group:
+                day_schedule.update(self._best_day_order(group, points, leaves_room(group, later_days, False)))
+            for activity in group:
+                located_left[bucket_of[id(activity)]] -= 1
+
+            free = [timeblock for timeblock in timeblocks if day_schedule[timeblock] is None]
+            for timeblock in list(free):
+                free.remove(timeblock)
+                rejected = set()
+                for activity in unlocated:
+                    bucket = bucket_of[id(activity)]
+                    if timeblock not in bucket or bucket in rejected:
+                        continue
+                    unlocated_left[bucket] -= 1
+                    if fits(located_left, unlocated_left, free, later_days, False):
+                        day_schedule[timeblock] = activity
+                        unlocated.remove(activity)
+                        break
+                    unlocated_left[bucket] += 1
+                    rejected.add(bucket)
+            schedule[(self.start_date + timedelta(days=day_num)).strftime('%Y-%m-%d')] = day_schedule
+
+        return schedule
+
     def calculate_trip_stats(self, schedule: Dict) -> Dict:
         """Calculate statistics for the generated schedule."""
         total_activities = 0
@@ -0,0 +1,137 @@
+import math
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+
+class LocalProjection:
+    """
+    Equirectangular projection to kilometres around a reference latitude.
+    Within a city the error is far below a walking block, and distances become
+    plain Euclidean ones.
+    """
+    def __init__(self, reference_latitude: float):
+        self.scale_x = math.radians(1) * EARTH_RADIUS_KM * math.cos(math.radians(reference_latitude))
+        self.scale_y = math.radians(1) * EARTH_RADIUS_KM
+
+    def __call__(self, location: Tuple[float, float]) -> Tuple[float, float]:
+        return (location[1] * self.scale_x, location[0] * self.scale_y)
+
+class GridIndex:
+    """
+    Uniform grid over projected points for nearest-neighbour queries with removal.
+    With about `per_cell` points per cell a query visits a handful of cells, so
+    building is O(n) and each query is close to O(1) for city-sized catalogs.
+    """
+    def __init__(self, points: Dict[int, Tuple[float, float]], per_cell: float = 2.0):
+        """
+        Args:
+            points: Projected (x, y) coordinates by item id
+            per_cell: Target number of points per grid cell
+        """
+        self.points = dict(points)
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        if not self.points:
+            self.cell_size = 1.0
+            return
+
+        xs = [x for x, _ in self.points.values()]
+        ys = [y for _, y in self.points.values()]
+        area = max(max(xs) - min(xs), 1e-9) * max(max(ys) - min(ys), 1e-9)
+        self.cell_size = max(math.sqrt(area * per_cell / len(self.points)), 1e-6)
+        self._min_cell = self._cell(min(xs), min(ys))
+        self._max_cell = self._cell(max(xs), max(ys))
+        for item, (x, y) in self.points.items():
+            self._cells.setdefault(self._cell(x, y), set()).add(item)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def remove(self, item: int):
+        x, y = self.points.pop(item)
+        cell = self._cell(x, y)
+        members = self._cells[cell]
+        members.discard(item)
+        if not members:
+            del self._cells[cell]
+
+    def _ring(self, center: Tuple[int, int], radius: int) -> Iterable[Tuple[int, int]]:
+        cx, cy = center
+        if radius == 0:
+            yield center
+            return
+        for dx in range(-radius, radius + 1):
+            yield (cx + dx, cy - radius)
+            yield (cx + dx, cy + radius)
+        for dy in range(-radius + 1, radius):
+            yield (cx - radius, cy + dy)
+            yield (cx + radius, cy + dy)
+
+    def nearest(self, x: float, y: float) -> Optional[Tuple[int, float]]:
+        """The closest remaining item to (x, y) and its distance, or None if empty."""
+        if not self.points:
+            return None
+        center = self._cell(x, y)
+        # Skip the empty rings between a query outside the grid and the grid itself
+        radius = max(
+            self._min_cell[0] - center[0], center[0] - self._max_cell[0],
+            self._min_cell[1] - center[1], center[1] - self._max_cell[1], 0
+        )
+        best: Optional[Tuple[int, float]] = None
+        while True:
+            if 8 * radius > len(self._cells):
+                # Rings now cover more cells than are occupied; scanning those is cheaper
+                for cell, members in self._cells.items():
+                    for item in members:
+                        px, py = self.points[item]
+                        distance = math.hypot(px - x, py - y)
+                        if best is None or distance < best[1]:
+                            best = (item, distance)
+                return best
+            for cell in self._ring(center, radius):
+                for item in self._cells.get(cell, ()):
+                    px, py = self.points[item]
+                    distance = math.hypot(px - x, py - y)
+                    if best is None or distance < best[1]:
+                        best = (item, distance)
+            # Anything in ring r + 1 is at least r cell widths away
+            if best is not None and best[1] <= radius * self.cell_size:
+                return best
+            radius += 1
+
+def path_length(points: List[Tuple[float, float]]) -> float:
+    return sum(math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(points, points[1:]))
+
+def two_opt(points: List[Tuple[float, float]], order: List[int], fixed_start: bool = True,
+            max_rounds: int = 20) -> List[int]:
+    """
+    Improve an open path by reversing segments while that shortens it.
+    Args:
+        points: Projected coordinates, indexed by the entries of `order`
+        order: Visiting order to improve
+        fixed_start: Keep the first stop in place (e.g. the hotel)
+        max_rounds: Cap on full passes; each pass is O(n^2)
+    """
+    order = list(order)
+    n = len(order)
+    first = 1 if fixed_start else 0
+
+    def dist(i: int, j: int) -> float:
+        a, b = points[order[i]], points[order[j]]
+        return math.hypot(a[0] - b[0], a[1] - b[1])
+
+    for _ in range(max_rounds):
+        improved = False
+        for i in range(first, n - 1):
+            for j in range(i + 1, n):
+                # Reverse order[i..j]: edges (i-1, i) and (j, j+1) become (i-1, j) and (i, j+1)
+                before = (dist(i - 1, i) if i > 0 else 0.0) + (dist(j, j + 1) if j + 1 < n else 0.0)
+                after = (dist(i - 1, j) if i > 0 else 0.0) + (dist(i, j + 1) if j + 1 < n else 0.0)
+                if after < before - 1e-12:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+        if not improved:
+            break
+    return order
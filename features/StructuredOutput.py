@@ -0,0 +1,94 @@
+import json
+import threading
+from typing import Dict, List, Optional
+from features.Scheduling import Activity
+
+TIMEBLOCKS = ('morning', 'afternoon', 'evening')
+
+# Compact activity records that map one-to-one onto Activity
+ACTIVITY_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'name': {'type': 'string'},
+            'category': {'type': 'string'},
+            'duration_hours': {'type': 'number'},
+            'price_min': {'type': 'number'},
+            'price_max': {'type': 'number'},
+            'best_time': {'type': 'string', 'enum': list(TIMEBLOCKS) + ['flexible']}
+        },
+        'required': ['name', 'category', 'duration_hours', 'price_min', 'price_max', 'best_time']
+    }
+}
+
+# A single bare URL and nothing else
+URL_GRAMMAR = r'''
+root ::= "http" "s"? "://" [^ \t\n"<>]+
+'''
+
+# One "<number>. <URL>" line per activity, for batched booking lookups
+NUMBERED_URL_GRAMMAR = r'''
+root ::= line+
+line ::= [0-9]+ ". " url "\n"
+url ::= "http" "s"? "://" [^ \t\n"<>]+
+'''
+
+_grammars: Dict[str, object] = {}
+_grammars_lock = threading.Lock()
+
+def get_grammar(name: str):
+    """Compile a grammar once per process: 'activities', 'url' or 'numbered_urls'."""
+    with _grammars_lock:
+        grammar = _grammars.get(name)
+        if grammar is None:
+            from llama_cpp import LlamaGrammar
+            if name == 'activities':
+                grammar = LlamaGrammar.from_json_schema(json.dumps(ACTIVITY_SCHEMA), verbose=False)
+            elif name == 'url':
+                grammar = LlamaGrammar.from_string(URL_GRAMMAR, verbose=False)
+            elif name == 'numbered_urls':
+                grammar = LlamaGrammar.from_string(NUMBERED_URL_GRAMMAR, verbose=False)
+            else:
+                raise ValueError(f"Unknown grammar: {name}")
+            _grammars[name] = grammar
+        return grammar
+
+def parse_activity_records(text: str) -> List[Dict]:
+    """
+    Decode a JSON array of activity records.
+    If generation stopped mid-array (max_tokens), the complete records are kept.
+    """
+    try:
+        records = json.loads(text)
+        return records if isinstance(records, list) else []
+    except json.JSONDecodeError:
+        pass
+
+    decoder = json.JSONDecoder()
+    records = []
+    position = text.find('[') + 1
+    while 0 < position < len(text):
+        # Skip separators between elements
+        while position < len(text) and text[position] in ' \t\r\n,':
+            position += 1
+        try:
+            record, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            break
+        records.append(record)
+    return records
+
+def activity_from_record(record: Dict) -> Activity:
+    """Build an Activity from a structured record."""
+    try:
+        best_time: Optional[str] = record['best_time']
+        return Activity(
+            name=record['name'],
+            duration=float(record['duration_hours']),
+            category=record['category'],
+            price=(float(record['price_min']), float(record['price_max'])),
+            preferred_time=best_time if best_time in TIMEBLOCKS else None
+        )
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid activity record {record}: {e}")
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from features.InferenceMetrics import InferenceMetrics, default_metrics
+
+# Answers that shape the suggestion prompt; everything else doesn't change the output
+KEY_FIELDS = ('destination', 'startDate', 'duration', 'budget', 'interests')
+
+class SuggestionCache:
+    def __init__(self, max_entries: int = 256, path: Optional[str] = None,
+                 parser: Optional[Callable[[str], Any]] = None,
+                 fields: Tuple[str, ...] = KEY_FIELDS,
+                 metrics: Optional[InferenceMetrics] = None):
+        """
+        LRU memoization of generated suggestions keyed on canonical questionnaire answers.
+        Args:
+            max_entries: Number of suggestions kept in memory
+            path: Optional JSON-lines file the cache is loaded from; each new suggestion is
+                appended to it, and save() compacts it to the current entries
+            parser: Optional function applied to the generated text before caching,
+                e.g. one returning the parsed Activity list (re-applied to the text on load)
+            fields: Answer fields that make up the cache key
+            metrics: Where lookups are reported (defaults to the process-wide one)
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.parser = parser
+        self.fields = fields
+        self.metrics = metrics or default_metrics
+        self.hits = 0
+        self.misses = 0
+        # key -> (generated text, stored value); the text is what gets persisted
+        self._entries: 'OrderedDict[str, Tuple[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            texts, lines = self._read()
+            for key, text in list(texts.items())[-max_entries:]:
+                self._entries[key] = (text, self.parser(text) if self.parser else text)
+            if lines > 2 * max(len(texts), 1):
+                # Mostly overwritten or evicted records; don't let the file grow without bound
+                self.save()
+
+    @staticmethod
+    def _normalize_text(value: str) -> str:
+        return ' '.join(str(value).casefold().split())
+
+    @staticmethod
+    def _normalize_month(value: str) -> str:
+        """Map the formats the questionnaire and examples use ('2024-06', 'June 2024') to YYYY-MM."""
+        value = ' '.join(str(value).split())
+        for fmt in ('%Y-%m', '%Y-%m-%d', '%B %Y', '%b %Y', '%m/%Y'):
+            try:
+                return datetime.strptime(value, fmt).strftime('%Y-%m')
+            except ValueError:
+                continue
+        return value.casefold()
+
+    def make_key(self, answers: Dict) -> str:
+        """Canonical form of the answers: normalized text, order-insensitive lists."""
+        canonical = {}
+        for field in self.fields:
+            value = answers.get(field)
+            if isinstance(value, (list, tuple, set)):
+                canonical[field] = sorted({self._normalize_text(item) for item in value})
+            elif field == 'startDate' and value:
+                canonical[field] = self._normalize_month(value)
+            elif value is not None:
+                canonical[field] = self._normalize_text(value)
+        return json.dumps(canonical, sort_keys=True)
+
+    def get(self, answers: Dict) -> Optional[Any]:
+        """Return the cached value for these answers, or None."""
+        start = time.perf_counter()
+        key = self.make_key(answers)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                value = None
+                self.misses += 1
+            else:
+                value = entry[1]
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if self.metrics.hooks:
+            self.metrics.observe_cache_lookup('suggestions', value is not None, time.perf_counter() - start)
+        return value
+
+    def set(self, answers: Dict, text: str) -> Any:
+        """Cache generated text (parsed first if a parser was given) and return the stored value."""
+        value = self.parser(text) if self.parser else text
+        key = self.make_key(answers)
+        with self._lock:
+            self._entries[key] = (text, value)
+            self._entries.move_to_end(key)
+            self._evict()
+        if self.path:
+            self._append(key, text)
+        return value
+
+    def memoize(self, answers: Dict, generate: Callable[[], str]) -> Any:
+        """Return the cached value, calling `generate` and caching its text on a miss."""
+        value = self.get(answers)
+        if value is None:
+            value = self.set(answers, generate())
+        return value
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read(self) -> Tuple['OrderedDict[str, str]', int]:
+        """Load `path` as key -> text in recency order, plus the number of records read."""
+        texts: 'OrderedDict[str, str]' = OrderedDict()
+        lines = 0
+        with open(self.path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                    key, text = record['key'], record['text']
+                except (ValueError, KeyError, TypeError):
+                    continue  # A record cut short by a crash mid-write
+                if isinstance(key, str) and isinstance(text, str):
+                    texts[key] = text
+                    texts.move_to_end(key)
+        return texts, lines
+
+    def _append(self, key: str, text: str):
+        """Append one record; a single O_APPEND write keeps other processes' records intact."""
+        record = (json.dumps({'key': key, 'text': text}, ensure_ascii=False) + '\n').encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+
+    def save(self):
+        """Compact `path` to one record per entry, keeping records other processes appended."""
+        texts = self._read()[0] if os.path.exists(self.path) else OrderedDict()
+        with self._lock:
+            for key, (text, _) in self._entries.items():
+                texts[key] = text
+                texts.move_to_end(key)
+        records = [json.dumps({'key': key, 'text': text}, ensure_ascii=False)
+                   for key, text in list(texts.items())[-self.max_entries:]]
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(record + '\n' for record in records))
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> Dict:
+        """Report hit/miss counters and the number of cached suggestions."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries)
+        }
@@ -0,0 +1,340 @@
+import math
+import mmap
+import os
+import struct
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from features.AlertManager import Alert, TripAlertManager
+from features.Scheduling import Activity
+
+TIMEBLOCKS = ('morning', 'afternoon', 'evening')
+MAGIC = b'TGB1'
+VERSION = 2
+NO_STRING = 0xFFFFFFFF  # String id of a missing optional field
+NO_ACTIVITY = -1
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Little-endian fixed-width records; every section starts on an 8-byte boundary
+_HEADER = struct.Struct('<4sIqq')                # magic, version, trip start/end (us since epoch)
+_SECTION = struct.Struct('<QQ')                  # offset, record count
+_STRING_OFFSET = struct.Struct('<I')             # end offset of each string in the blob
+_ACTIVITY = struct.Struct('<IIdddddb7x')         # name, category, duration, price min/max, lat/lon (NaN if none), preferred
+_DAY = struct.Struct('<I' + 'i' * len(TIMEBLOCKS))  # date, activity index per timeblock
+_BOOKING = struct.Struct('<IIIIIIII')            # name, url, price range, duration, category,
+                                                 # preferred time, first occurrence, occurrences
+_OCCURRENCE = struct.Struct('<II')               # date, timeblock
+_ALERT = struct.Struct('<qIIIIB7x')              # date, title, description, type, priority, acknowledged
+
+# Section order in the header
+STRINGS, BLOB, ACTIVITIES, DAYS, BOOKINGS, OCCURRENCES, ALERTS = range(7)
+_SECTION_COUNT = 7
+_BOOKING_FIELDS = ('booking_url', 'price_range', 'duration', 'category', 'preferred_time')
+
+def _micros(date: datetime) -> int:
+    return (date - _EPOCH) // timedelta(microseconds=1)
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+class _StringTable:
+    """Interns strings so each distinct value is stored once."""
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.encoded: List[bytes] = []
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return NO_STRING
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.encoded)
+            self.encoded.append(value.encode('utf-8'))
+        return string_id
+
+def _pad(data: bytearray):
+    data.extend(b'\0' * (-len(data) % 8))
+
+def write_bundle(filename: str, trip_start: datetime, trip_end: datetime, schedule: Dict,
+                 booking_info: Optional[Dict] = None, alerts: Optional[Iterable[Alert]] = None,
+                 activities: Iterable[Activity] = ()):
+    """
+    Write a trip as one compact binary bundle for offline use.
+    The file is replaced atomically, so readers never see a partial bundle.
+    Args:
+        filename: Bundle file to write
+        trip_start, trip_end: Trip dates
+        schedule: Schedule dictionary from TripScheduler
+        booking_info: Booking information from ReservationManager
+        alerts: Alerts, e.g. TripAlertManager.alerts
+        activities: Extra activities to store besides the scheduled ones
+    """
+    strings = _StringTable()
+
+    # Activities are stored once each, scheduled ones first
+    activity_index: Dict[int, int] = {}
+    activity_records = bytearray()
+    def add_activity(activity: Activity) -> int:
+        index = activity_index.get(id(activity))
+        if index is None:
+            index = activity_index[id(activity)] = len(activity_index)
+            preferred = TIMEBLOCKS.index(activity.preferred_time) if activity.preferred_time in TIMEBLOCKS else -1
+            latitude, longitude = activity.location or (math.nan, math.nan)
+            activity_records.extend(_ACTIVITY.pack(
+                strings.intern(activity.name), strings.intern(activity.category),
+                activity.duration, activity.price[0], activity.price[1], latitude, longitude, preferred
+            ))
+        return index
+
+    day_records = bytearray()
+    for date in sorted(schedule):
+        day_schedule = schedule[date]
+        slots = [
+            add_activity(day_schedule[timeblock]) if day_schedule.get(timeblock) else NO_ACTIVITY
+            for timeblock in TIMEBLOCKS
+        ]
+        day_records.extend(_DAY.pack(strings.intern(date), *slots))
+    for activity in activities:
+        add_activity(activity)
+
+    booking_records = bytearray()
+    occurrence_records = bytearray()
+    occurrence_count = 0
+    for name, info in (booking_info or {}).items():
+        occurrences = info.get('occurrences', [])
+        booking_records.extend(_BOOKING.pack(
+            strings.intern(name),
+            *(strings.intern(info.get(field)) for field in _BOOKING_FIELDS),
+            occurrence_count, len(occurrences)
+        ))
+        for occurrence in occurrences:
+            occurrence_records.extend(_OCCURRENCE.pack(
+                strings.intern(occurrence['date']), strings.intern(occurrence.get('timeblock'))
+            ))
+        occurrence_count += len(occurrences)
+
+    # Alerts are sorted by date so readers can binary-search a time window
+    alert_records = bytearray()
+    sorted_alerts = sorted(alerts or (), key=lambda alert: alert.date)
+    for alert in sorted_alerts:
+        alert_records.extend(_ALERT.pack(
+            _micros(alert.date), strings.intern(alert.title), strings.intern(alert.description),
+            strings.intern(alert.alert_type), strings.intern(alert.priority), alert.acknowledged
+        ))
+
+    string_offsets = bytearray()
+    blob = bytearray()
+    for encoded in strings.encoded:
+        blob.extend(encoded)
+        string_offsets.extend(_STRING_OFFSET.pack(len(blob)))
+
+    sections = [
+        (string_offsets, len(strings.encoded)),
+        (blob, len(blob)),
+        (activity_records, len(activity_index)),
+        (day_records, len(schedule)),
+        (booking_records, len(booking_info or {})),
+        (occurrence_records, occurrence_count),
+        (alert_records, len(sorted_alerts))
+    ]
+
+    data = bytearray(_HEADER.pack(MAGIC, VERSION, _micros(trip_start), _micros(trip_end)))
+    table_position = len(data)
+    data.extend(b'\0' * (_SECTION.size * _SECTION_COUNT))
+    _pad(data)
+    for number, (section, count) in enumerate(sections):
+        _SECTION.pack_into(data, table_position + number * _SECTION.size, len(data), count)
+        data.extend(section)
+        _pad(data)
+
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_filename, filename)
+
+class TripBundle:
+    def __init__(self, filename: str):
+        """
+        Read-only, memory-mapped view of a bundle written by write_bundle.
+        Opening only reads the header; records are decoded on access, so looking
+        up one day or a window of alerts touches just those pages of the file.
+        """
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, trip_start, trip_end = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a trip bundle: {filename}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported trip bundle version {version}: {filename}")
+        self.trip_start = _from_micros(trip_start)
+        self.trip_end = _from_micros(trip_end)
+        self._sections: List[Tuple[int, int]] = [
+            _SECTION.unpack_from(self._view, _HEADER.size + number * _SECTION.size)
+            for number in range(_SECTION_COUNT)
+        ]
+
+    def close(self):
+        """
+        Unmap the bundle. Views returned by string_bytes() stay readable until they are
+        released; the mapping is then freed along with the last of them.
+        """
+        if self._mmap is None:
+            return
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # Exported views keep the mmap alive; dropping our reference defers the unmap
+        self._mmap = None
+
+    def __enter__(self) -> 'TripBundle':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _record(self, section: int, record: struct.Struct, index: int) -> Tuple:
+        offset, count = self._sections[section]
+        if not 0 <= index < count:
+            raise IndexError(f"Record {index} out of range (0-{count - 1})")
+        return record.unpack_from(self._view, offset + index * record.size)
+
+    def string_bytes(self, string_id: int) -> memoryview:
+        """Zero-copy UTF-8 bytes of an interned string; release() it to free the mapping early."""
+        offset = self._sections[STRINGS][0]
+        end = _STRING_OFFSET.unpack_from(self._view, offset + string_id * 4)[0]
+        start = _STRING_OFFSET.unpack_from(self._view, offset + (string_id - 1) * 4)[0] if string_id else 0
+        blob = self._sections[BLOB][0]
+        return self._view[blob + start:blob + end]
+
+    def string(self, string_id: int) -> Optional[str]:
+        if string_id == NO_STRING:
+            return None
+        return str(self.string_bytes(string_id), 'utf-8')
+
+    # Activities
+
+    @property
+    def activity_count(self) -> int:
+        return self._sections[ACTIVITIES][1]
+
+    def activity(self, index: int) -> Activity:
+        (name, category, duration, price_min, price_max,
+         latitude, longitude, preferred) = self._record(ACTIVITIES, _ACTIVITY, index)
+        return Activity(
+            self.string(name), duration, self.string(category), (price_min, price_max),
+            TIMEBLOCKS[preferred] if preferred >= 0 else None,
+            None if math.isnan(latitude) else (latitude, longitude)
+        )
+
+    # Schedule
+
+    @property
+    def day_count(self) -> int:
+        return self._sections[DAYS][1]
+
+    def dates(self) -> List[str]:
+        return [self.string(self._record(DAYS, _DAY, index)[0]) for index in range(self.day_count)]
+
+    def day(self, day: Union[int, str]) -> Dict[str, Optional[Activity]]:
+        """One day's schedule, by index or 'YYYY-MM-DD' date."""
+        index = self._day_index(day) if isinstance(day, str) else day
+        slots = self._record(DAYS, _DAY, index)[1:]
+        return {
+            timeblock: self.activity(slot) if slot != NO_ACTIVITY else None
+            for timeblock, slot in zip(TIMEBLOCKS, slots)
+        }
+
+    def _day_index(self, date: str) -> int:
+        # Days are stored in date order
+        lo, hi = 0, self.day_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.string(self._record(DAYS, _DAY, mid)[0]) < date:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.day_count or self.string(self._record(DAYS, _DAY, lo)[0]) != date:
+            raise KeyError(date)
+        return lo
+
+    def schedule(self) -> Dict:
+        """The whole schedule; each activity is decoded once, like the original objects."""
+        activities: Dict[int, Activity] = {}
+        schedule = {}
+        for index in range(self.day_count):
+            date, *slots = self._record(DAYS, _DAY, index)
+            day_schedule = {}
+            for timeblock, slot in zip(TIMEBLOCKS, slots):
+                if slot != NO_ACTIVITY and slot not in activities:
+                    activities[slot] = self.activity(slot)
+                day_schedule[timeblock] = activities.get(slot)
+            schedule[self.string(date)] = day_schedule
+        return schedule
+
+    # Booking information
+
+    @property
+    def booking_count(self) -> int:
+        return self._sections[BOOKINGS][1]
+
+    def booking(self, index: int) -> Tuple[str, Dict]:
+        """One activity's booking information as (activity name, info)."""
+        name, *fields, first, count = self._record(BOOKINGS, _BOOKING, index)
+        info = {
+            field: self.string(string_id)
+            for field, string_id in zip(_BOOKING_FIELDS, fields) if string_id != NO_STRING
+        }
+        occurrences = []
+        for occurrence in range(first, first + count):
+            date, timeblock = self._record(OCCURRENCES, _OCCURRENCE, occurrence)
+            entry = {'date': self.string(date)}
+            if timeblock != NO_STRING:
+                entry['timeblock'] = self.string(timeblock)
+            occurrences.append(entry)
+        info['occurrences'] = occurrences
+        return self.string(name), info
+
+    def booking_info(self) -> Dict:
+        return dict(self.booking(index) for index in range(self.booking_count))
+
+    # Alerts
+
+    @property
+    def alert_count(self) -> int:
+        return self._sections[ALERTS][1]
+
+    def alert(self, index: int) -> Alert:
+        date, title, description, alert_type, priority, acknowledged = self._record(ALERTS, _ALERT, index)
+        alert = Alert(self.string(title), self.string(description), _from_micros(date),
+                      self.string(alert_type), self.string(priority))
+        alert.acknowledged = bool(acknowledged)
+        return alert
+
+    def _alert_position(self, micros: int, right: bool) -> int:
+        offset = self._sections[ALERTS][0]
+        lo, hi = 0, self.alert_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            # The date is the first field, so read just those 8 bytes
+            value = struct.unpack_from('<q', self._view, offset + mid * _ALERT.size)[0]
+            if value < micros or (right and value == micros):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def alerts_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Alert]:
+        """Alerts with start <= date <= end, found by binary search over the fixed-width records."""
+        lo = 0 if start is None else self._alert_position(_micros(start), right=False)
+        hi = self.alert_count if end is None else self._alert_position(_micros(end), right=True)
+        return [self.alert(index) for index in range(lo, hi)]
+
+    def alert_manager(self) -> TripAlertManager:
+        """A TripAlertManager holding every alert in the bundle."""
+        manager = TripAlertManager(self.trip_start, self.trip_end)
+        manager.alerts = self.alerts_between()
+        return manager
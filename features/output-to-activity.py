@@ -1,13 +1,44 @@
-from typing import List, Dict, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Optional
 import re
 from datetime import datetime
 from Scheduling import Activity
 
+_PRICE_NUMBER = re.compile(r'\d+')
+_DURATION_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+# Time-of-day keywords, checked in this order of precedence
+_TIME_KEYWORDS = {
+    'morning': ['morning', 'sunrise', 'early', 'breakfast'],
+    'afternoon': ['afternoon', 'lunch', 'noon', 'midday'],
+    'evening': ['evening', 'sunset', 'night', 'dinner']
+}
+_TIME_PRECEDENCE = list(_TIME_KEYWORDS)
+_KEYWORD_TIME = {keyword: time for time, keywords in _TIME_KEYWORDS.items() for keyword in keywords}
+# One alternation finds every keyword in a single scan; longest first so 'afternoon' beats 'noon'
+_TIME_PATTERN = re.compile('|'.join(sorted(_KEYWORD_TIME, key=len, reverse=True)))
+
+# Map detail keys to our expected format
+_KEY_MAPPING = {
+    'duration': 'duration',
+    'price': 'price_range',
+    'category': 'category',
+    'best time': 'best_time',
+    'time': 'best_time'
+}
+
+class ConversionError(ValueError):
+    def __init__(self, record_index: int, record: Dict, message: str):
+        """A single activity record that could not be converted."""
+        super().__init__(f"Record {record_index} ({record.get('name', '?')}): {message}")
+        self.record_index = record_index
+        self.record = record
+        self.message = message
+
 class ActivityConverter:
     @staticmethod
     def parse_price_range(price_str: str) -> tuple[float, float]:
         """Extract price range from string format like '$30-40' or '$30 - $40'."""
-        numbers = re.findall(r'\d+', price_str)
+        numbers = _PRICE_NUMBER.findall(price_str)
         if len(numbers) >= 2:
             return (float(numbers[0]), float(numbers[1]))
         elif len(numbers) == 1:
@@ -24,7 +55,7 @@ class ActivityConverter:
             return 8.0
         
         # Extract numbers and determine if it's a range
-        numbers = re.findall(r'\d+(?:\.\d+)?', duration_str)
+        numbers = _DURATION_NUMBER.findall(duration_str)
         if len(numbers) >= 2:
             # If it's a range (e.g., "2-3 hours"), take the average
             return (float(numbers[0]) + float(numbers[1])) / 2
@@ -36,25 +67,14 @@ class ActivityConverter:
     @staticmethod
     def determine_preferred_time(time_str: str) -> Optional[str]:
         """Determine preferred time from description."""
-        time_str = time_str.lower()
-        
-        # Define time-related keywords
-        morning_keywords = ['morning', 'sunrise', 'early', 'breakfast']
-        afternoon_keywords = ['afternoon', 'lunch', 'noon', 'midday']
-        evening_keywords = ['evening', 'sunset', 'night', 'dinner']
-        
-        # Check for time keywords
-        for keyword in morning_keywords:
-            if keyword in time_str:
-                return 'morning'
-        for keyword in afternoon_keywords:
-            if keyword in time_str:
-                return 'afternoon'
-        for keyword in evening_keywords:
-            if keyword in time_str:
-                return 'evening'
-        
-        return None
+        best = None
+        for match in _TIME_PATTERN.finditer(time_str.lower()):
+            time = _KEYWORD_TIME[match.group()]
+            if time == 'morning':
+                return time
+            if best is None or _TIME_PRECEDENCE.index(time) < _TIME_PRECEDENCE.index(best):
+                best = time
+        return best
 
     @staticmethod
     def convert_llm_activity(activity_dict: Dict) -> Activity:
@@ -94,48 +114,126 @@ class ActivityConverter:
         Parse the LLM response text into a list of activity dictionaries.
         This is a simple implementation - you might need to adjust based on your exact LLM output format.
         """
-        activities = []
-        current_activity = {}
+        parser = IncrementalActivityParser()
+        activities = parser.feed(llm_text)
+        activities.extend(parser.close())
+        return activities
+
+    @staticmethod
+    def stream_activities(text_chunks: Iterable[str]) -> Iterator[Activity]:
+        """
+        Convert streamed LLM text into Activity objects as soon as each block is complete.
+        Blocks missing required fields (e.g. section headings) are skipped.
+        Booking lookups on the same model can't run while the stream is open: collect
+        the activities, or hand them to another thread that waits for the model.
         
-        # Split text into lines and process
-        lines = llm_text.split('\n')
-        for line in lines:
-            line = line.strip()
-            
-            # Skip empty lines
-            if not line:
-                continue
-                
-            # Check for new activity (assumes activities start with a name)
-            if line and not line.startswith('-') and ':' not in line:
-                if current_activity:
-                    activities.append(current_activity)
-                current_activity = {'name': line}
-                continue
-                
-            # Parse activity details
-            if line.startswith('-'):
-                line = line.lstrip('- ')
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.strip().lower()
-                    value = value.strip()
-                    
-                    # Map keys to our expected format
-                    key_mapping = {
-                        'duration': 'duration',
-                        'price': 'price_range',
-                        'category': 'category',
-                        'best time': 'best_time',
-                        'time': 'best_time'
-                    }
-                    
-                    mapped_key = key_mapping.get(key)
-                    if mapped_key:
-                        current_activity[mapped_key] = value
+        Usage:
+            for activity in ActivityConverter.stream_activities(generator.stream_suggestions(answers)):
+                scheduler.add_activity(activity)
+        """
+        parser = IncrementalActivityParser()
+
+        def completed_records() -> Iterator[Dict]:
+            for chunk in text_chunks:
+                yield from parser.feed(chunk)
+            yield from parser.close()
+
+        return ActivityConverter._convert_records(completed_records(), on_error=None)
+
+    @staticmethod
+    def convert_many(lines: Iterable[str],
+                     on_error: Optional[Callable[[ConversionError], None]] = None) -> Iterator[Activity]:
+        """
+        Stream Activity objects out of large stored LLM outputs in a single pass.
         
+        Args:
+            lines: Lines of text, e.g. an open file; trailing newlines are ignored
+            on_error: Called with a ConversionError for each record that can't be
+                converted; the batch continues either way
+        """
+        parser = IncrementalActivityParser()
+
+        def completed_records() -> Iterator[Dict]:
+            for line in lines:
+                record = parser.feed_line(line)
+                if record:
+                    yield record
+            yield from parser.close()
+
+        return ActivityConverter._convert_records(completed_records(), on_error)
+
+    @staticmethod
+    def _convert_records(records: Iterable[Dict],
+                         on_error: Optional[Callable[[ConversionError], None]]) -> Iterator[Activity]:
+        for record_index, record in enumerate(records):
+            # Blocks without any details are headings, not failed activities
+            if len(record) == 1:
+                continue
+            try:
+                yield ActivityConverter.convert_llm_activity(record)
+            except ValueError as e:
+                if on_error:
+                    on_error(ConversionError(record_index, record, str(e)))
+
+class IncrementalActivityParser:
+    def __init__(self):
+        """Line-oriented parser that can be fed LLM output a fragment at a time."""
+        self.current_activity: Dict = {}
+        self._pending = ''  # Text after the last newline, not yet a full line
+
+    def feed(self, text: str) -> List[Dict]:
+        """
+        Consume a fragment of LLM output.
+        Returns:
+            List[Dict]: Activities whose blocks were completed by this fragment
+        """
+        self._pending += text
+        *lines, self._pending = self._pending.split('\n')
+
+        completed = []
+        for line in lines:
+            activity = self.feed_line(line)
+            if activity:
+                completed.append(activity)
+        return completed
+
+    def close(self) -> List[Dict]:
+        """Flush the trailing line and the last activity."""
+        completed = []
+        line, self._pending = self._pending, ''
+        activity = self.feed_line(line)
+        if activity:
+            completed.append(activity)
+
         # Don't forget the last activity
-        if current_activity:
-            activities.append(current_activity)
+        if self.current_activity:
+            completed.append(self.current_activity)
+            self.current_activity = {}
+        return completed
+
+    def feed_line(self, line: str) -> Optional[Dict]:
+        """Apply one complete line; return the previous activity if this line starts a new one."""
+        line = line.strip()
+        
+        # Skip empty lines
+        if not line:
+            return None
             
-        return activities
\ No newline at end of file
+        # Check for new activity (assumes activities start with a name)
+        if not line.startswith('-') and ':' not in line:
+            finished = self.current_activity
+            self.current_activity = {'name': line}
+            return finished or None
+            
+        # Parse activity details
+        if line.startswith('-'):
+            line = line.lstrip('- ')
+            if ':' in line:
+                key, value = line.split(':', 1)
+                key = key.strip().lower()
+                value = value.strip()
+                
+                mapped_key = _KEY_MAPPING.get(key)
+                if mapped_key:
+                    self.current_activity[mapped_key] = value
+        return None
\ No newline at end of file
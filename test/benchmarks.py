@@ -0,0 +1,405 @@
+'''
+TripGenius: Performance Benchmarks
+
+Times the hot paths of the features package at realistic and stress sizes and
+stores the results as a JSON baseline that later runs can be compared against.
+LLM-backed code runs against FakeLlama, a deterministic stand-in that replays
+canned responses with configurable latency, so no GGUF model is needed.
+
+Usage (from the repository root):
+    python test/benchmarks.py --output baseline.json
+    python test/benchmarks.py --compare baseline.json --threshold 1.25
+    python test/benchmarks.py --model llama-2-13b-chat.gguf --draft-model tinyllama.gguf
+'''
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from features.Scheduling import TripScheduler, Activity
+from features.AlertManager import TripAlertManager
+from features.AIRecommender import TripSuggestionGenerator
+from features.FastDecode import DECODE_MODES
+from features.ModelRegistry import ModelRegistry
+from features.ReservationManager import ReservationManager
+
+# output-to-activity.py isn't importable by name and imports Scheduling as a top-level module
+sys.path.insert(0, os.path.join(ROOT, 'features'))
+_spec = importlib.util.spec_from_file_location(
+    'output_to_activity', os.path.join(ROOT, 'features', 'output-to-activity.py')
+)
+output_to_activity = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(output_to_activity)
+ActivityConverter = output_to_activity.ActivityConverter
+
+CATEGORIES = ['Cultural', 'Culinary', 'Outdoor', 'Nightlife', 'Relaxation']
+TIMEBLOCKS = [None, 'morning', 'afternoon', 'evening']
+
+class FakeLlama:
+    """Llama stand-in that returns canned completions after a fixed delay."""
+    def __init__(self, model_path: str, latency: float = 0.0, token_latency: float = 0.0,
+                 responses: Optional[Dict[str, str]] = None, **load_kwargs):
+        """
+        Args:
+            model_path: Ignored; kept for Llama compatibility
+            latency: Seconds added to every completion
+            token_latency: Seconds added per generated whitespace-separated token
+            responses: Completion text by prompt marker; the first marker found in
+                the prompt wins, '' is the fallback
+        """
+        self.model_path = model_path
+        self.latency = latency
+        self.token_latency = token_latency
+        self.responses = responses or {'': 'https://www.getyourguide.com/'}
+        self.calls = 0
+        self._input_ids: List[bytes] = []
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[bytes]:
+        return text.split()
+
+    def reset(self):
+        self._input_ids = []
+
+    def eval(self, tokens: List[bytes]):
+        self._input_ids.extend(tokens)
+
+    def save_state(self) -> List[bytes]:
+        return list(self._input_ids)
+
+    def load_state(self, state: List[bytes]):
+        self._input_ids = list(state)
+
+    def _response(self, prompt: str) -> str:
+        for marker, text in self.responses.items():
+            if marker and marker in prompt:
+                return text
+        return self.responses.get('', '')
+
+    def __call__(self, prompt: str, max_tokens: int = 16, stream: bool = False, **kwargs):
+        self.calls += 1
+        text = self._response(prompt)
+        if stream:
+            return self._stream(text)
+        time.sleep(self.latency + self.token_latency * len(text.split()))
+        usage = {
+            'prompt_tokens': len(self.tokenize(prompt.encode('utf-8'))),
+            'completion_tokens': len(text.split())
+        }
+        return {'choices': [{'text': text, 'finish_reason': 'stop'}], 'usage': usage}
+
+    def _stream(self, text: str) -> Iterator[Dict]:
+        # One chunk per whitespace-separated token, so closing the stream early saves time
+        time.sleep(self.latency)
+        for token in re.findall(r'\s*\S+', text):
+            time.sleep(self.token_latency)
+            yield {'choices': [{'text': token, 'finish_reason': None}]}
+        yield {'choices': [{'text': '', 'finish_reason': 'stop'}]}
+
+def make_activities(count: int, rng: random.Random) -> List[Activity]:
+    return [
+        Activity(
+            f"Activity {i}",
+            rng.choice([1, 2, 2.5, 3, 4]),
+            rng.choice(CATEGORIES),
+            (rng.randint(0, 60), rng.randint(60, 200)),
+            rng.choice(TIMEBLOCKS)
+        )
+        for i in range(count)
+    ]
+
+def make_scheduler(days: int, activities: int, seed: int = 0,
+                   start: datetime = datetime(2030, 6, 1)) -> TripScheduler:
+    rng = random.Random(seed)
+    scheduler = TripScheduler(start, start + timedelta(days=days - 1), seed=seed)
+    for activity in make_activities(activities, rng):
+        scheduler.add_activity(activity)
+    return scheduler
+
+def make_llm_text(activities: int) -> str:
+    blocks = []
+    for i in range(activities):
+        if i % 10 == 0:
+            blocks.append(CATEGORIES[(i // 10) % len(CATEGORIES)])
+        blocks.append(
+            f"Activity {i}\n"
+            f"- Duration: {1 + i % 4}-{2 + i % 4} hours\n"
+            f"- Price: ${10 + i % 50}-{60 + i % 50}\n"
+            f"- Category: {CATEGORIES[i % len(CATEGORIES)]}\n"
+            f"- Best time: {['Early morning', 'After lunch', 'Sunset', 'Any time'][i % 4]}\n"
+            f"- Notes: Book ahead in peak season"
+        )
+    return '\n\n'.join(blocks)
+
+def make_booking_info(schedule: Dict) -> Dict:
+    booking_info = {}
+    for date, day_schedule in schedule.items():
+        for timeblock, activity in day_schedule.items():
+            if activity:
+                info = booking_info.setdefault(activity.name, {
+                    'booking_url': 'https://www.getyourguide.com/',
+                    'price_range': f"${activity.price[0]}-${activity.price[1]}",
+                    'occurrences': []
+                })
+                info['occurrences'].append({'date': date, 'timeblock': timeblock})
+    return booking_info
+
+def time_call(function: Callable, repeat: int, min_sample: float = 0.02) -> Dict:
+    """
+    Time `function` `repeat` times and summarize seconds per call.
+    Fast functions are looped so each sample lasts at least `min_sample` seconds.
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_sample or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_sample / elapsed) + 1)
+
+    timings = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        timings.append((time.perf_counter() - start) / loops)
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'max': max(timings),
+        'repeat': repeat,
+        'loops': loops
+    }
+
+def benchmark_scheduling(size: str, days: int, activities: int, repeat: int) -> Dict[str, Dict]:
+    scheduler = make_scheduler(days, activities)
+    schedule = scheduler.generate_schedule()
+    return {
+        f"schedule.generate_schedule[{size}]": time_call(scheduler.generate_schedule, repeat),
+        f"schedule.generate_optimal_schedule[{size}]": time_call(scheduler.generate_optimal_schedule, repeat),
+        f"schedule.calculate_trip_stats[{size}]": time_call(
+            lambda: scheduler.calculate_trip_stats(schedule), repeat
+        )
+    }
+
+def benchmark_routes(size: str, days: int, points_of_interest: int, repeat: int) -> Dict[str, Dict]:
+    """Route scheduling over a city-wide catalog of located activities (about 20 x 20 km)."""
+    rng = random.Random(0)
+    scheduler = make_scheduler(days, 0)
+    for activity in make_activities(points_of_interest, rng):
+        activity.location = (41.9 + rng.uniform(-0.09, 0.09), 12.5 + rng.uniform(-0.12, 0.12))
+        scheduler.add_activity(activity)
+    return {
+        f"schedule.generate_route_schedule[{size}]": time_call(scheduler.generate_route_schedule, repeat)
+    }
+
+def benchmark_parsing(size: str, activities: int, repeat: int) -> Dict[str, Dict]:
+    text = make_llm_text(activities)
+    lines = text.split('\n')
+    best_times = ['Early morning', 'After lunch', 'Sunset', 'Any time'] * (activities // 4 + 1)
+    return {
+        f"parse.parse_llm_response[{size}]": time_call(
+            lambda: ActivityConverter.parse_llm_response(text), repeat
+        ),
+        f"parse.convert_many[{size}]": time_call(
+            lambda: list(ActivityConverter.convert_many(lines)), repeat
+        ),
+        f"parse.determine_preferred_time[{size}]": time_call(
+            lambda: [ActivityConverter.determine_preferred_time(t) for t in best_times], repeat
+        )
+    }
+
+def benchmark_alerts(size: str, days: int, activities: int, repeat: int) -> Dict[str, Dict]:
+    # Start the trip soon so get_upcoming_alerts has alerts to return, not an empty window
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    scheduler = make_scheduler(days, activities, start=today + timedelta(days=3))
+    schedule = scheduler.generate_schedule()
+    booking_info = make_booking_info(schedule)
+
+    def generate() -> TripAlertManager:
+        manager = TripAlertManager(scheduler.start_date, scheduler.end_date)
+        manager.generate_trip_alerts(schedule, booking_info)
+        return manager
+
+    manager = generate()
+    # Middle third of the trip, independent of the current date
+    window_start = scheduler.start_date + timedelta(days=days // 3)
+    window_end = scheduler.start_date + timedelta(days=2 * days // 3 + 1)
+    results = {
+        f"alerts.generate_trip_alerts[{size}]": time_call(generate, repeat),
+        f"alerts.get_upcoming_alerts[{size}]": time_call(
+            lambda: manager.get_upcoming_alerts(days=30), repeat
+        ),
+        f"alerts.get_alerts[{size}]": time_call(
+            lambda: manager.get_alerts(window_start, window_end), repeat
+        )
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'alerts.json')
+        results[f"alerts.save_alerts[{size}]"] = time_call(lambda: manager.save_alerts(filename), repeat)
+        results[f"alerts.load_alerts[{size}]"] = time_call(
+            lambda: TripAlertManager.load_alerts(filename), repeat
+        )
+    return results
+
+def benchmark_booking(size: str, days: int, activities: int, repeat: int,
+                      latency: float) -> Dict[str, Dict]:
+    registry = ModelRegistry(model_factory=lambda **kwargs: FakeLlama(latency=latency, **kwargs))
+    manager = ReservationManager(model_path='fake.gguf', registry=registry)
+    schedule = make_scheduler(days, activities).generate_schedule()
+    try:
+        return {
+            f"booking.get_booking_information[{size}]": time_call(
+                lambda: manager.get_booking_information(schedule, "Barcelona"), repeat, min_sample=0
+            )
+        }
+    finally:
+        manager.close()
+
+# A URL followed by the kind of chatter an untuned chat model adds after it
+CHATTY_URL = ("https://www.getyourguide.com/barcelona-l45/\n"
+              "This is the official booking page, where you can compare time slots, "
+              "read reviews from other travelers and reserve skip-the-line tickets in advance.")
+TRIP_ANSWERS = {
+    'destination': 'Barcelona', 'startDate': '2030-06', 'duration': 'Weekend',
+    'interests': ['Cultural', 'Food & Dining'], 'budget': 'Moderate ($1000-3000)'
+}
+
+def benchmark_decode_modes(size: str, activities: int, repeat: int, latency: float,
+                           token_latency: float = 0.002) -> Dict[str, Dict]:
+    """Standard vs early-stop decoding against FakeLlama (speculation needs a real model)."""
+    results = {}
+    registry = ModelRegistry(model_factory=lambda **kwargs: FakeLlama(
+        latency=latency, token_latency=token_latency, responses={'': CHATTY_URL}, **kwargs
+    ))
+    names = [f"Activity {i}" for i in range(activities)]
+    for mode in ('standard', 'early_stop'):
+        manager = ReservationManager(model_path='fake.gguf', registry=registry, decode_mode=mode)
+        try:
+            results[f"decode.{mode}.booking_urls[{size}]"] = time_call(
+                lambda: [manager._get_booking_url(name, "Barcelona") for name in names],
+                repeat, min_sample=0
+            )
+        finally:
+            manager.close()
+    return results
+
+def benchmark_model_decode_modes(model_path: str, draft_model_path: Optional[str],
+                                 repeat: int) -> Dict[str, Dict]:
+    """
+    Latency of every decode mode on a real GGUF model (needs llama_cpp).
+    One registry is shared, so the model is reloaded once when speculation needs logits_all.
+    """
+    results = {}
+    registry = ModelRegistry()
+    names = ["Sagrada Familia tour", "Park Guell entry", "Tapas cooking class"]
+    for mode in DECODE_MODES:
+        if mode == 'draft' and not draft_model_path:
+            continue
+        options = {'registry': registry, 'decode_mode': mode, 'draft_model_path': draft_model_path}
+        booking = ReservationManager(model_path=model_path, cache=None, reuse_prompt_prefix=False, **options)
+        generator = TripSuggestionGenerator(model_path=model_path, reuse_prompt_prefix=False, **options)
+        try:
+            results[f"decode.{mode}.booking_url"] = time_call(
+                lambda: [booking._get_booking_url(name, "Barcelona") for name in names],
+                repeat, min_sample=0
+            )
+            results[f"decode.{mode}.generate_activities"] = time_call(
+                lambda: generator.generate_activities(TRIP_ANSWERS), repeat, min_sample=0
+            )
+        finally:
+            booking.close()
+            generator.close()
+    return results
+
+def run_benchmarks(repeat: int, llm_latency: float, sizes: List[str]) -> Dict[str, Dict]:
+    # (days, activities) per size; stress is well beyond a typical questionnaire
+    shapes = {
+        'realistic': (7, 20),
+        'stress': (30, 500)
+    }
+    results = {}
+    for size in sizes:
+        days, activities = shapes[size]
+        results.update(benchmark_scheduling(size, days, activities, repeat))
+        results.update(benchmark_routes(size, days, activities * 100, max(1, repeat // 5)))
+        results.update(benchmark_parsing(size, activities * 10, repeat))
+        results.update(benchmark_alerts(size, days, activities, repeat))
+        results.update(benchmark_booking(size, days, activities, max(1, repeat // 5), llm_latency))
+        results.update(benchmark_decode_modes(size, activities, max(1, repeat // 5), llm_latency))
+    return results
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """
+    Print ratios of the fastest sample against a baseline and return the names that regressed.
+    The minimum is compared because it is the least sensitive to scheduler noise.
+    """
+    regressions = []
+    print(f"\n{'benchmark':<48} {'baseline':>11} {'current':>11} {'ratio':>7}")
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<48} {'-':>11} {current['min']:>11.6f} {'new':>7}")
+            continue
+        ratio = current['min'] / previous['min'] if previous['min'] else float('inf')
+        flag = '  <-- regression' if ratio > threshold else ''
+        print(f"{name:<48} {previous['min']:>11.6f} {current['min']:>11.6f} {ratio:>7.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="TripGenius performance benchmarks")
+    parser.add_argument('--repeat', type=int, default=10, help="Timed runs per benchmark")
+    parser.add_argument('--llm-latency', type=float, default=0.01,
+                        help="Seconds FakeLlama sleeps per completion")
+    parser.add_argument('--sizes', nargs='+', default=['realistic', 'stress'],
+                        choices=['realistic', 'stress'])
+    parser.add_argument('--model', help="GGUF model to compare decode modes on (needs llama_cpp)")
+    parser.add_argument('--draft-model', help="Small GGUF model for the 'draft' decode mode")
+    parser.add_argument('--output', help="Write results as a JSON baseline")
+    parser.add_argument('--compare', help="Baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Ratio above which a benchmark counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeat, args.llm_latency, args.sizes)
+    if args.model:
+        results.update(benchmark_model_decode_modes(args.model, args.draft_model, max(1, args.repeat // 5)))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'created': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        return 1 if regressions else 0
+
+    for name, timing in sorted(results.items()):
+        print(f"{name:<48} median {timing['median']:.6f}s  min {timing['min']:.6f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+'''
+TripGenius: Tests for the array-backed activity table
+
+Compares the vectorized trip statistics with TripScheduler.calculate_trip_stats.
+'''
+
+import gc
+import os
+import random
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.ActivityTable import ActivityTable
+from features.Scheduling import Activity, TripScheduler
+
+START = datetime(2030, 6, 1)
+
+class TestActivityTable(unittest.TestCase):
+    def test_trip_stats_match_calculate_trip_stats(self):
+        rng = random.Random(0)
+        table = ActivityTable(capacity=4)
+        schedules = []
+        for trip in range(5):
+            scheduler = TripScheduler(START, START + timedelta(days=trip), seed=trip)
+            for i in range(10):
+                scheduler.add_activity(Activity(
+                    f"Activity {i}", rng.choice([1, 2, 3]), rng.choice(['Cultural', 'Outdoor', 'Food']),
+                    (rng.randint(0, 50), rng.randint(50, 100)), rng.choice(['morning', None])
+                ))
+            schedule = scheduler.generate_schedule()
+            schedules.append((scheduler, schedule))
+
+        stats = table.trip_stats([schedule for _, schedule in schedules])
+        for (scheduler, schedule), result in zip(schedules, stats):
+            expected = scheduler.calculate_trip_stats(schedule)
+            self.assertEqual(result['total_activities'], expected['total_activities'])
+            self.assertEqual(result['cost_range'], expected['cost_range'])
+            self.assertEqual(result['activities_by_category'], expected['activities_by_category'])
+
+    def test_new_activities_are_not_mistaken_for_freed_ones(self):
+        table = ActivityTable()
+        for price, category in (((10, 10), 'Cultural'), ((999, 999), 'Outdoor')):
+            # Each batch is freed before the next, so CPython hands its ids to the new activities
+            schedules = [
+                {'2030-06-01': {'morning': Activity('Visit', 2, category, price), 'afternoon': None}}
+                for _ in range(200)
+            ]
+            for stats in table.trip_stats(schedules):
+                self.assertEqual(stats['cost_range'], price)
+                self.assertEqual(stats['activities_by_category'], {category: 1})
+            del schedules
+            gc.collect()
+
+    def test_plain_activities_are_read_on_every_call(self):
+        table = ActivityTable()
+        activity = Activity('Visit', 2, 'Cultural', (10, 20))
+        schedule = {'2030-06-01': {'morning': activity, 'afternoon': table.add('Lunch', 1, 'Food', (5, 15))}}
+        self.assertEqual(table.trip_stats([schedule])[0]['cost_range'], (15, 35))
+
+        activity.price = (100, 200)
+        activity.category = 'Outdoor'
+        stats = table.trip_stats([schedule])[0]
+        self.assertEqual(stats['cost_range'], (105, 215))
+        self.assertEqual(stats['activities_by_category'], {'Outdoor': 1, 'Food': 1})
+        self.assertEqual(list(stats['daily_hours']), [3])
+        # Only the explicitly added row is stored
+        self.assertEqual(len(table), 1)
+
+    def test_views_read_rows(self):
+        table = ActivityTable(capacity=1)
+        view = table.add('Colosseum', 3, 'Cultural', (16, 24), 'morning', (41.89, 12.49))
+        table.add('Trastevere', 2, 'Food', (20, 40))
+        self.assertEqual((view.name, view.duration, view.category, view.price, view.preferred_time),
+                         ('Colosseum', 3.0, 'Cultural', (16.0, 24.0), 'morning'))
+        self.assertEqual(view.location, (41.89, 12.49))
+        self.assertIsNone(table.view(1).location)
+        self.assertIsNone(table.view(1).preferred_time)
+
+if __name__ == "__main__":
+    unittest.main()
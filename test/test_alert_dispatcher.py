@@ -0,0 +1,114 @@
+'''
+TripGenius: Tests for the alert dispatcher
+
+Drives AlertDispatcher with a fake clock to check which alerts are delivered and
+when, and that a failing callback neither stops delivery nor loses alerts.
+'''
+
+import asyncio
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.AlertDispatcher import AlertDispatcher
+from features.AlertManager import TripAlertManager
+
+TRIP_START = datetime(2030, 6, 1)
+TRIP_END = datetime(2030, 6, 7)
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+class TestAlertDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(TRIP_START - timedelta(days=10))
+        self.dispatcher = AlertDispatcher(clock=self.clock)
+        self.delivered = []
+        self.dispatcher.add_callback(lambda trip_id, alert: self.delivered.append((trip_id, alert.title)))
+
+    def trip(self, trip_id: str, *days: int) -> TripAlertManager:
+        manager = TripAlertManager(TRIP_START, TRIP_END)
+        for day in days:
+            manager.add_alert(f"{trip_id} day {day}", '', TRIP_START + timedelta(days=day), 'reminder')
+        self.dispatcher.register(trip_id, manager)
+        return manager
+
+    def advance_to(self, day: int):
+        self.clock.now = TRIP_START + timedelta(days=day)
+        return self.dispatcher.dispatch_due()
+
+    def test_alerts_are_delivered_once_when_due(self):
+        self.trip('rome', 1, 3)
+        self.trip('paris', 2)
+        self.assertEqual(self.dispatcher.next_due(), TRIP_START + timedelta(days=1))
+        self.assertEqual(self.advance_to(0), [])
+
+        self.advance_to(2)
+        self.assertEqual(self.delivered, [('rome', 'rome day 1'), ('paris', 'paris day 2')])
+        self.advance_to(2)
+        self.assertEqual(len(self.delivered), 2)
+        self.advance_to(5)
+        self.assertEqual(self.delivered[2:], [('rome', 'rome day 3')])
+        self.assertIsNone(self.dispatcher.next_due())
+
+    def test_acknowledged_alerts_are_skipped(self):
+        manager = self.trip('rome', 1, 2)
+        manager.acknowledge_alert(manager.alerts[0])
+        self.advance_to(3)
+        self.assertEqual(self.delivered, [('rome', 'rome day 2')])
+
+    def test_update_picks_up_new_alerts(self):
+        manager = self.trip('rome', 4)
+        manager.add_alert('rome day 1', '', TRIP_START + timedelta(days=1), 'reminder')
+        self.dispatcher.update('rome')
+        self.assertEqual(self.dispatcher.next_due(), TRIP_START + timedelta(days=1))
+        self.advance_to(1)
+        self.assertEqual(self.delivered, [('rome', 'rome day 1')])
+
+        self.dispatcher.unregister('rome')
+        self.advance_to(5)
+        self.assertEqual(len(self.delivered), 1)
+
+    def test_failing_callback_does_not_stop_delivery(self):
+        def fail(trip_id, alert):
+            raise RuntimeError('push service down')
+
+        self.dispatcher.callbacks.insert(0, fail)
+        self.trip('rome', 1)
+        self.trip('paris', 1)
+        with self.assertLogs('tripgenius.alerts', 'ERROR') as logs:
+            self.advance_to(1)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(sorted(self.delivered), [('paris', 'paris day 1'), ('rome', 'rome day 1')])
+
+    def test_failing_coroutine_callback_is_logged_and_run_continues(self):
+        async def fail(trip_id, alert):
+            raise RuntimeError('push service down')
+
+        self.dispatcher.add_callback(fail)
+        self.trip('rome', 1, 2)
+
+        async def main():
+            runner = asyncio.ensure_future(self.dispatcher.run())
+            for day in (1, 2):
+                self.clock.now = TRIP_START + timedelta(days=day)
+                self.dispatcher.update('rome')  # Wake run() up for the new time
+                for _ in range(5):
+                    await asyncio.sleep(0)
+            self.dispatcher.stop()
+            await asyncio.wait_for(runner, 5)
+
+        with self.assertLogs('tripgenius.alerts', 'ERROR') as logs:
+            asyncio.run(main())
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(self.delivered, [('rome', 'rome day 1'), ('rome', 'rome day 2')])
+
+if __name__ == "__main__":
+    unittest.main()
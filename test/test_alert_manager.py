@@ -0,0 +1,104 @@
+'''
+TripGenius: Tests for trip alerts and their journal
+
+Covers the indexed alert queries and the append-only journal: replay of adds,
+acknowledgements and removals, compaction, and recovery from a torn write.
+'''
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.AlertManager import AlertJournal, TripAlertManager
+
+TRIP_START = datetime(2030, 6, 1)
+TRIP_END = datetime(2030, 6, 7)
+
+class TestAlertJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'alerts.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def add(self, manager: TripAlertManager, title: str, day: int = 0):
+        return manager.add_alert(title, f"{title} description", TRIP_START + timedelta(days=day), 'reminder')
+
+    def reopen(self, **journal_options) -> TripAlertManager:
+        return TripAlertManager.open_journal(self.filename, **journal_options)
+
+    def titles(self, manager: TripAlertManager):
+        return [alert.title for alert in manager.alerts]
+
+    def test_replay_restores_adds_acknowledgements_and_removals(self):
+        manager = TripAlertManager(TRIP_START, TRIP_END)
+        manager.attach_journal(self.filename)
+        a = self.add(manager, 'a', 2)
+        b = self.add(manager, 'b', 1)
+        c = self.add(manager, 'c', 3)
+        manager.acknowledge_alert(a)
+        manager.remove_alert(c)
+        manager.close_journal()
+
+        reopened = self.reopen()
+        self.assertEqual(reopened.trip_start, TRIP_START)
+        self.assertEqual(self.titles(reopened), ['b', 'a'])
+        self.assertEqual([alert.title for alert in reopened.get_alerts(acknowledged=True)], ['a'])
+        reopened.close_journal()
+
+    def test_compaction_keeps_alerts_and_shrinks_log(self):
+        manager = TripAlertManager(TRIP_START, TRIP_END)
+        manager.attach_journal(self.filename, min_compact_records=8, compact_ratio=2.0)
+        kept = self.add(manager, 'kept')
+        for i in range(20):
+            manager.remove_alert(self.add(manager, f"temporary {i}", 1))
+        manager.acknowledge_alert(kept)
+        manager.close_journal()
+
+        with open(self.filename) as f:
+            self.assertLess(len(f.readlines()), 8)
+        reopened = self.reopen()
+        self.assertEqual(self.titles(reopened), ['kept'])
+        self.assertTrue(reopened.alerts[0].acknowledged)
+        reopened.close_journal()
+
+    def test_torn_write_is_dropped_before_appending(self):
+        manager = TripAlertManager(TRIP_START, TRIP_END)
+        manager.attach_journal(self.filename)
+        self.add(manager, 'a')
+        manager.close_journal()
+        with open(self.filename, 'a') as f:
+            f.write('{"op":"add","id":1,"alert":{"tit')  # Crash in the middle of a record
+
+        reopened = self.reopen()
+        self.add(reopened, 'b', 1)
+        self.add(reopened, 'c', 2)
+        reopened.close_journal()
+
+        self.assertEqual([record['op'] for record in AlertJournal.replay(self.filename)],
+                         ['trip', 'add', 'add', 'add'])
+        again = self.reopen()
+        self.assertEqual(self.titles(again), ['a', 'b', 'c'])
+        again.close_journal()
+
+class TestTripAlertManager(unittest.TestCase):
+    def test_queries_use_date_and_attribute_indexes(self):
+        manager = TripAlertManager(TRIP_START, TRIP_END)
+        for day in (3, 1, 2):
+            manager.add_alert(f"day {day}", '', TRIP_START + timedelta(days=day), 'reminder',
+                              'high' if day == 2 else 'normal')
+        self.assertEqual([alert.title for alert in manager.alerts], ['day 1', 'day 2', 'day 3'])
+        self.assertEqual(
+            [alert.title for alert in manager.get_alerts(start=TRIP_START + timedelta(days=2))],
+            ['day 2', 'day 3']
+        )
+        self.assertEqual([alert.title for alert in manager.get_alerts(priority='high')], ['day 2'])
+        self.assertEqual(manager.next_alert(TRIP_START + timedelta(days=1)).title, 'day 2')
+
+if __name__ == "__main__":
+    unittest.main()
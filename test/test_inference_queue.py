@@ -0,0 +1,106 @@
+'''
+TripGenius: Tests for the async inference queue
+
+Covers round-robin fairness between clients, merging of batchable requests,
+backpressure, and cancellation of a running request.
+'''
+
+import asyncio
+import os
+import sys
+import threading
+import unittest
+from concurrent.futures import CancelledError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.InferenceQueue import InferenceQueue, QueueFullError
+
+class TestInferenceQueue(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.queue = InferenceQueue(max_pending=8, workers=1, token_budget=100)
+        self.gate = threading.Event()
+        self.order = []
+
+    async def asyncTearDown(self):
+        self.gate.set()
+        await self.queue.close()
+
+    def run_as(self, label: str):
+        def run(cancelled: threading.Event) -> str:
+            self.order.append(label)
+            return label
+        return run
+
+    async def block_worker(self) -> asyncio.Task:
+        """Occupy the single worker until self.gate is set, so requests pile up behind it."""
+        started = threading.Event()
+
+        def run(cancelled: threading.Event):
+            started.set()
+            self.gate.wait(5)
+
+        task = asyncio.ensure_future(self.queue.submit(run, client_id='gate'))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        return task
+
+    async def test_clients_are_served_round_robin(self):
+        blocker = await self.block_worker()
+        tasks = [asyncio.ensure_future(self.queue.submit(self.run_as(f"a{i}"), client_id='a')) for i in range(3)]
+        tasks.append(asyncio.ensure_future(self.queue.submit(self.run_as('b0'), client_id='b')))
+        await asyncio.sleep(0)
+        self.gate.set()
+        await asyncio.gather(blocker, *tasks)
+        self.assertEqual(self.order, ['a0', 'b0', 'a1', 'a2'])
+
+    async def test_requests_with_same_batch_key_are_merged_within_budget(self):
+        batches = []
+
+        def run_batch(payloads, cancelled):
+            batches.append(list(payloads))
+            return [payload.upper() for payload in payloads]
+
+        blocker = await self.block_worker()
+        tasks = [
+            asyncio.ensure_future(self.queue.submit(
+                client_id=f"client {i}", payload=f"item {i}", batch_key='urls', run_batch=run_batch, cost=40
+            ))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        self.gate.set()
+        await blocker
+        self.assertEqual(await asyncio.gather(*tasks), ['ITEM 0', 'ITEM 1', 'ITEM 2'])
+        # 40 + 40 fits the budget of 100; the third request needs a second batch
+        self.assertEqual(batches, [['item 0', 'item 1'], ['item 2']])
+
+    async def test_full_queue_applies_backpressure(self):
+        blocker = await self.block_worker()
+        tasks = [asyncio.ensure_future(self.queue.submit(self.run_as(str(i)), client_id='a')) for i in range(8)]
+        await asyncio.sleep(0)
+        with self.assertRaises(QueueFullError):
+            await self.queue.submit(self.run_as('overflow'), client_id='b', wait=False)
+        self.gate.set()
+        await asyncio.gather(blocker, *tasks)
+
+    async def test_cancelled_request_does_not_stop_the_queue(self):
+        running = threading.Event()
+
+        def generate(cancelled: threading.Event):
+            running.set()
+            if not cancelled.wait(5):
+                return 'finished'
+            raise CancelledError()  # How long generations give up on a cancelled caller
+
+        task = asyncio.ensure_future(self.queue.submit(generate, client_id='a'))
+        await asyncio.get_running_loop().run_in_executor(None, running.wait, 5)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        result = await asyncio.wait_for(self.queue.submit(self.run_as('next'), client_id='b'), 5)
+        self.assertEqual(result, 'next')
+        self.assertTrue(all(not worker.done() for worker in self.queue._tasks))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+'''
+TripGenius: Tests for the shared model registry
+
+Covers sharing one model between handles and the guard that keeps a completion
+from running on a model whose stream is still open on the same thread.
+'''
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.ModelRegistry import ModelRegistry
+
+class FakeLlama:
+    """Llama stand-in that streams its response one word at a time."""
+    loads = 0
+
+    def __init__(self, model_path: str, **kwargs):
+        FakeLlama.loads += 1
+        self.model_path = model_path
+        self.draft_model = None
+
+    def tokenize(self, text: bytes):
+        return text.split()
+
+    def __call__(self, prompt: str, stream: bool = False, **kwargs):
+        text = f"reply to {prompt}"
+        if stream:
+            return ({'choices': [{'text': word + ' '}]} for word in text.split())
+        return {'choices': [{'text': text}]}
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        FakeLlama.loads = 0
+        self.registry = ModelRegistry(model_factory=FakeLlama)
+        self.suggestions = self.registry.acquire('model.gguf')
+        self.booking = self.registry.acquire('model.gguf')
+
+    def test_handles_share_one_lazily_loaded_model(self):
+        self.assertEqual(FakeLlama.loads, 0)
+        self.assertEqual(self.suggestions('a')['choices'][0]['text'], 'reply to a')
+        self.assertEqual(self.booking('b')['choices'][0]['text'], 'reply to b')
+        self.assertEqual(FakeLlama.loads, 1)
+
+    def test_completion_during_open_stream_raises_on_same_thread(self):
+        stream = self.suggestions('a', stream=True)
+        next(stream)
+        with self.assertRaises(RuntimeError):
+            self.booking('b')
+        stream.close()
+        # The stream's lock is released once it is closed
+        self.assertEqual(self.booking('b')['choices'][0]['text'], 'reply to b')
+
+    def test_other_threads_wait_for_open_stream(self):
+        stream = self.suggestions('a', stream=True)
+        next(stream)
+        finished = threading.Event()
+
+        def lookup():
+            self.booking('b')
+            finished.set()
+
+        thread = threading.Thread(target=lookup)
+        thread.start()
+        self.assertFalse(finished.wait(0.1))
+        list(stream)
+        thread.join(5)
+        self.assertTrue(finished.is_set())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+'''
+TripGenius: Tests for booking-URL resolution
+
+Runs ReservationManager against a scripted stand-in model to check how batched
+answers are parsed, which lookups fall back to single prompts, and what is cached.
+'''
+
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.BookingCache import BookingURLCache
+from features.InferenceQueue import InferenceQueue
+from features.ModelRegistry import ModelRegistry
+from features.ReservationManager import ReservationManager
+from features.Scheduling import Activity, ScheduleDiff
+
+class ScriptedLlama:
+    """Answers batch prompts with `batch_reply` and single prompts with a URL per activity."""
+    batch_reply = ''
+    single_reply = None
+
+    def __init__(self, model_path: str, **kwargs):
+        self.draft_model = None
+        self.prompts = []
+
+    def __call__(self, prompt: str, **kwargs):
+        self.prompts.append(prompt)
+        if 'each of these activities' in prompt:
+            text = ScriptedLlama.batch_reply
+        else:
+            name = re.search(r"Activity: '(.*)'", prompt).group(1)
+            text = ScriptedLlama.single_reply or f"https://single.example/{name.replace(' ', '-')}"
+        return {'choices': [{'text': text}]}
+
+class TestReservationManager(unittest.TestCase):
+    def setUp(self):
+        ScriptedLlama.batch_reply = ''
+        ScriptedLlama.single_reply = None
+        self.manager = ReservationManager(
+            registry=ModelRegistry(model_factory=ScriptedLlama), reuse_prompt_prefix=False
+        )
+
+    def tearDown(self):
+        self.manager.close()
+
+    def test_batch_reply_urls_are_taken_from_anywhere_on_the_line(self):
+        ScriptedLlama.batch_reply = (
+            "1. Sagrada Familia Tour: https://sagradafamilia.org/tickets.\n"
+            "2) https://www.parkguell.barcelona/\n"
+        )
+        urls = self.manager.resolve_booking_urls(
+            ['Sagrada Familia Tour', 'Park Guell'], 'Barcelona', batch_size=2
+        )
+        self.assertEqual(urls, {
+            'Sagrada Familia Tour': 'https://sagradafamilia.org/tickets',
+            'Park Guell': 'https://www.parkguell.barcelona/'
+        })
+
+    def test_numbered_lines_without_url_fall_back_to_single_lookups(self):
+        ScriptedLlama.batch_reply = "1. Sagrada Familia Tour\n2. https://www.parkguell.barcelona/\n"
+        urls = self.manager.resolve_booking_urls(
+            ['Sagrada Familia Tour', 'Park Guell'], 'Barcelona', batch_size=2
+        )
+        self.assertEqual(urls['Sagrada Familia Tour'], 'https://single.example/Sagrada-Familia-Tour')
+        self.assertEqual(urls['Park Guell'], 'https://www.parkguell.barcelona/')
+
+    def test_batch_size_and_max_workers_must_be_positive(self):
+        for kwargs in ({'batch_size': 0}, {'max_workers': 0}):
+            with self.assertRaises(ValueError):
+                self.manager.resolve_booking_urls(['Park Guell'], 'Barcelona', **kwargs)
+
+    def test_only_url_answers_are_cached(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.manager.cache = BookingURLCache(os.path.join(directory, 'cache.sqlite3'))
+            ScriptedLlama.single_reply = "I'm not sure which site sells these tickets."
+            self.manager.resolve_booking_urls(['Park Guell'], 'Barcelona')
+            self.assertIsNone(self.manager.cache.get('Park Guell', 'Barcelona'))
+
+            ScriptedLlama.single_reply = None
+            self.manager.resolve_booking_urls(['Park Guell'], 'Barcelona')
+            self.assertEqual(self.manager.cache.get('Park Guell', 'Barcelona'),
+                             'https://single.example/Park-Guell')
+
+    def test_latencies_are_kept_per_call(self):
+        first, second = {}, {}
+        self.manager.resolve_booking_urls(['Park Guell'], 'Barcelona', latencies=first)
+        self.manager.resolve_booking_urls(['Casa Batllo', 'Casa Mila'], 'Barcelona', latencies=second)
+        self.assertEqual(list(first), ['Park Guell'])
+        self.assertEqual(sorted(second), ['Casa Batllo', 'Casa Mila'])
+        self.assertTrue(all(latency >= 0 for latency in second.values()))
+
+    def test_queued_lookups_report_latency_to_each_caller(self):
+        ScriptedLlama.batch_reply = "1. https://a.example/\n2. https://b.example/\n"
+        schedules = [{'2030-06-01': {'morning': Activity(name, 2, 'Cultural', (10, 20))}}
+                     for name in ('Park Guell', 'Casa Mila')]
+
+        async def main():
+            async with InferenceQueue() as queue:
+                # Occupy the worker so both callers' lookups are merged into one batch
+                blocker = asyncio.ensure_future(queue.submit(lambda cancelled: None))
+                latencies = [{}, {}]
+                results = await asyncio.gather(blocker, *(
+                    self.manager.aget_booking_information(schedule, 'Barcelona', queue,
+                                                          client_id=i, latencies=latencies[i])
+                    for i, schedule in enumerate(schedules)
+                ))
+                return results[1:], latencies
+
+        (first, second), latencies = asyncio.run(main())
+        self.assertIn('Park Guell', first)
+        self.assertIn('Casa Mila', second)
+        self.assertEqual([list(latency) for latency in latencies], [['Park Guell'], ['Casa Mila']])
+
+    def test_activity_moved_within_a_merged_diff_is_not_looked_up_again(self):
+        colosseum, pantheon = Activity('Colosseum', 3, 'Cultural', (16, 24)), Activity('Pantheon', 1, 'Cultural', (0, 5))
+        booking_info = {'Colosseum': dict(
+            self.manager._booking_entry(colosseum, 'https://old.example/colosseum'),
+            occurrences=[{'date': '2030-06-01', 'timeblock': 'morning'}]
+        )}
+        # Remove the Colosseum, put the Pantheon in its slot, re-add the Colosseum the next day
+        diff = ScheduleDiff()
+        diff.record('2030-06-01', 'morning', colosseum, None)
+        later = ScheduleDiff()
+        later.record('2030-06-01', 'morning', None, pantheon)
+        later.record('2030-06-02', 'morning', None, colosseum)
+        diff.merge(later)
+
+        latencies = {}
+        self.manager.update_booking_information(booking_info, diff, 'Rome', latencies=latencies)
+        self.assertEqual(list(latencies), ['Pantheon'])
+        self.assertEqual(booking_info['Colosseum']['booking_url'], 'https://old.example/colosseum')
+        self.assertEqual(booking_info['Colosseum']['occurrences'], [{'date': '2030-06-02', 'timeblock': 'morning'}])
+        self.assertEqual(booking_info['Pantheon']['occurrences'], [{'date': '2030-06-01', 'timeblock': 'morning'}])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+'''
+TripGenius: Tests for trip scheduling
+
+Checks the optimal scheduler against an exhaustive search on small random trips,
+route scheduling against the optimal scheduler, and incremental rescheduling
+against regenerating booking info and alerts.
+'''
+
+import os
+import random
+import re
+import sys
+import unittest
+from datetime import datetime, timedelta
+from itertools import combinations
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.AlertManager import TripAlertManager
+from features.ModelRegistry import ModelRegistry
+from features.ReservationManager import ReservationManager
+from features.Scheduling import Activity, TripScheduler
+
+TIMEBLOCKS = ('morning', 'afternoon', 'evening')
+START = datetime(2030, 6, 1)
+
+def random_scheduler(rng: random.Random, days: int, activities: int) -> TripScheduler:
+    scheduler = TripScheduler(START, START + timedelta(days=days - 1), seed=0)
+    for i in range(activities):
+        scheduler.add_activity(Activity(
+            f"Activity {i}",
+            rng.choice([1, 2, 3, 3.5, 4, 5]),
+            'Cultural',
+            (0, rng.randint(10, 100)),
+            rng.choice(TIMEBLOCKS + (None, None))
+        ))
+    return scheduler
+
+def scheduled(schedule: Dict) -> List[Activity]:
+    return [activity for day in schedule.values() for activity in day.values() if activity]
+
+def most_placeable(scheduler: TripScheduler, activities: List[Activity]) -> int:
+    """Exhaustive search for the most activities that fit the trip's slots."""
+    days = (scheduler.end_date - scheduler.start_date).days + 1
+    slots = [(day, timeblock) for day in range(days) for timeblock in TIMEBLOCKS]
+
+    def best(index: int, used: frozenset) -> int:
+        if index == len(activities):
+            return 0
+        result = best(index + 1, used)
+        for slot in slots:
+            if slot not in used and scheduler._can_fit_in_timeblock(activities[index], slot[1]):
+                result = max(result, 1 + best(index + 1, used | {slot}))
+        return result
+
+    return best(0, frozenset())
+
+class ScheduleTestCase(unittest.TestCase):
+    def assertValidSchedule(self, scheduler: TripScheduler, schedule: Dict):
+        days = (scheduler.end_date - scheduler.start_date).days + 1
+        self.assertEqual(len(schedule), days)
+        placed = scheduled(schedule)
+        self.assertEqual(len(placed), len({id(activity) for activity in placed}))
+        for day in schedule.values():
+            for timeblock, activity in day.items():
+                if activity:
+                    self.assertTrue(scheduler._can_fit_in_timeblock(activity, timeblock))
+
+class TestTripScheduler(ScheduleTestCase):
+    def test_optimal_schedule_places_as_many_as_exhaustive_search(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            scheduler = random_scheduler(rng, rng.randint(1, 2), rng.randint(0, 8))
+            schedule = scheduler.generate_optimal_schedule()
+            self.assertValidSchedule(scheduler, schedule)
+            self.assertEqual(len(scheduled(schedule)), most_placeable(scheduler, scheduler.activities))
+
+    def test_optimal_schedule_respects_budget(self):
+        rng = random.Random(1)
+        for _ in range(100):
+            scheduler = random_scheduler(rng, rng.randint(1, 2), rng.randint(0, 7))
+            budget = rng.randint(0, 250)
+            schedule = scheduler.generate_optimal_schedule(max_budget=budget)
+            self.assertValidSchedule(scheduler, schedule)
+            placed = scheduled(schedule)
+            self.assertLessEqual(sum(activity.price[1] for activity in placed), budget)
+
+            best = 0
+            for size in range(len(scheduler.activities) + 1):
+                for subset in combinations(scheduler.activities, size):
+                    if (sum(activity.price[1] for activity in subset) <= budget
+                            and most_placeable(scheduler, list(subset)) == size):
+                        best = size
+            self.assertEqual(len(placed), best)
+
+class TestRouteSchedule(ScheduleTestCase):
+    def test_mixed_catalogs_place_as_many_as_optimal_schedule(self):
+        rng = random.Random(2)
+        for _ in range(200):
+            scheduler = random_scheduler(rng, rng.randint(1, 7), rng.randint(0, 30))
+            for activity in scheduler.activities:
+                if rng.random() < 0.6:
+                    activity.location = (41.85 + rng.random() / 10, 12.45 + rng.random() / 10)
+            schedule = scheduler.generate_route_schedule()
+            self.assertValidSchedule(scheduler, schedule)
+            self.assertEqual(len(scheduled(schedule)), len(scheduled(scheduler.generate_optimal_schedule())))
+
+    def test_days_stay_within_a_neighbourhood(self):
+        from features.SpatialIndex import LocalProjection, path_length
+
+        rng = random.Random(3)
+        scheduler = random_scheduler(rng, 5, 2000)
+        for activity in scheduler.activities:
+            activity.location = (41.8 + rng.random() / 5, 12.4 + rng.random() / 5)
+        project = LocalProjection(41.9)
+
+        def travel(schedule: Dict) -> float:
+            return sum(path_length([project(activity.location) for activity in day.values() if activity])
+                       for day in schedule.values())
+
+        route = scheduler.generate_route_schedule()
+        optimal = scheduler.generate_optimal_schedule()
+        self.assertEqual(len(scheduled(route)), len(scheduled(optimal)))
+        self.assertLess(travel(route), travel(optimal) / 2)
+
+    def line_scheduler(self, offsets: List[float], days: int) -> TripScheduler:
+        """Flexible activities along a line of latitude, added in a shuffled order."""
+        scheduler = TripScheduler(START, START + timedelta(days=days - 1), seed=0)
+        for i in random.Random(4).sample(range(len(offsets)), len(offsets)):
+            scheduler.add_activity(Activity(f"Stop {i}", 2, 'Cultural', (0, 10), None, (41.9, 12.5 + offsets[i])))
+        return scheduler
+
+    def test_days_are_consecutive_stretches_of_the_route(self):
+        # Nine stops 1 km apart: the route runs along the line, so each day gets three neighbours
+        scheduler = self.line_scheduler([i * 0.0121 for i in range(9)], 3)
+        schedule = scheduler.generate_route_schedule(start_location=(41.9, 12.5))
+        self.assertEqual([sorted(activity.name for activity in day.values()) for day in schedule.values()],
+                         [[f"Stop {i}" for i in range(day * 3, day * 3 + 3)] for day in range(3)])
+
+    def test_daily_travel_matches_a_consecutive_cut_of_the_route(self):
+        from features.SpatialIndex import LocalProjection, path_length
+
+        rng = random.Random(5)
+        offsets = sorted(rng.uniform(0, 0.5) for _ in range(42))
+        scheduler = self.line_scheduler(offsets, 14)
+        project = LocalProjection(41.9)
+        schedule = scheduler.generate_route_schedule(start_location=(41.9, 12.5))
+
+        travel = sum(path_length([project(activity.location) for activity in day.values() if activity])
+                     for day in schedule.values())
+        # Walking the line from its west end, in runs of three stops per day
+        cut = sum(path_length([project((41.9, 12.5 + offset)) for offset in offsets[i:i + 3]])
+                  for i in range(0, len(offsets), 3))
+        self.assertEqual(len(scheduled(schedule)), 42)
+        self.assertAlmostEqual(travel, cut)
+
+class URLLlama:
+    """Stand-in model that answers every booking prompt with a URL derived from the activity."""
+    def __init__(self, model_path: str, **kwargs):
+        self.draft_model = None
+
+    def __call__(self, prompt: str, **kwargs):
+        name = re.search(r"Activity: '(.*)'", prompt).group(1)
+        return {'choices': [{'text': f"https://book.example/{name.replace(' ', '-')}"}]}
+
+def alert_records(manager: TripAlertManager):
+    return sorted((alert.date, alert.alert_type, alert.title, alert.description, alert.priority)
+                  for alert in manager.alerts)
+
+class TestIncrementalScheduling(unittest.TestCase):
+    def setUp(self):
+        # Far enough ahead that every booking deadline is still in the future
+        self.start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=60)
+        self.reservations = ReservationManager(
+            registry=ModelRegistry(model_factory=URLLlama), reuse_prompt_prefix=False
+        )
+
+    def tearDown(self):
+        self.reservations.close()
+
+    def test_edits_match_full_regeneration(self):
+        rng = random.Random(0)
+        scheduler = TripScheduler(self.start, self.start + timedelta(days=4), seed=0)
+        counter = 0
+
+        def new_activity() -> Activity:
+            nonlocal counter
+            counter += 1
+            return Activity(f"Activity {counter}", rng.choice([1, 2, 3, 4, 5]), 'Cultural',
+                            (0, rng.randint(10, 100)), rng.choice(TIMEBLOCKS + (None,)))
+
+        for _ in range(12):
+            scheduler.add_activity(new_activity())
+        schedule = scheduler.start_incremental()
+        shadow = {date: dict(day) for date, day in schedule.items()}
+        booking_info = self.reservations.get_booking_information(schedule, 'Rome')
+        alerts = TripAlertManager(scheduler.start_date, scheduler.end_date)
+        alerts.generate_trip_alerts(schedule, booking_info)
+
+        for _ in range(200):
+            if scheduler.activities and rng.random() < 0.5:
+                diff = scheduler.remove_activity(rng.choice(scheduler.activities))
+            else:
+                diff = scheduler.add_activity(new_activity())
+
+            for (date, timeblock), (old, new) in diff.changes.items():
+                self.assertIs(shadow[date][timeblock], old)
+                shadow[date][timeblock] = new
+            self.assertEqual(shadow, schedule)
+            self.assertEqual(sorted(id(activity) for activity in scheduled(schedule)),
+                             sorted({id(activity) for activity in scheduled(schedule)}))
+
+            # Nothing waits while a free slot would take it, as with add-time placement
+            placed = {id(activity) for activity in scheduled(schedule)}
+            for activity in scheduler.activities:
+                if id(activity) not in placed:
+                    for day in schedule.values():
+                        for timeblock, slot in day.items():
+                            self.assertFalse(slot is None and scheduler._can_fit_in_timeblock(activity, timeblock))
+
+            self.reservations.update_booking_information(booking_info, diff, 'Rome')
+            self.assertEqual(booking_info, self.reservations.get_booking_information(schedule, 'Rome'))
+
+            alerts.update_trip_alerts(diff, booking_info)
+            regenerated = TripAlertManager(scheduler.start_date, scheduler.end_date)
+            regenerated.generate_trip_alerts(schedule, booking_info)
+            self.assertEqual(alert_records(alerts), alert_records(regenerated))
+
+if __name__ == "__main__":
+    unittest.main()
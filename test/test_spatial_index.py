@@ -0,0 +1,58 @@
+'''
+TripGenius: Tests for the spatial index used by route scheduling
+
+Compares grid nearest-neighbour queries with a linear scan and checks 2-opt.
+'''
+
+import math
+import os
+import random
+import sys
+import unittest
+from itertools import permutations
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.SpatialIndex import GridIndex, LocalProjection, path_length, two_opt
+
+class TestGridIndex(unittest.TestCase):
+    def test_nearest_matches_linear_scan_while_removing(self):
+        rng = random.Random(0)
+        for spread in (0.0, 0.5, 20.0):
+            points = {i: (rng.gauss(0, spread), rng.gauss(0, spread)) for i in range(300)}
+            index = GridIndex(points)
+            while len(index):
+                # Queries from inside and far outside the indexed area
+                x, y = rng.uniform(-3, 3) * (spread + 1), rng.uniform(-3, 3) * (spread + 1)
+                item, distance = index.nearest(x, y)
+                expected = min(math.hypot(px - x, py - y) for px, py in points.values())
+                self.assertAlmostEqual(distance, expected)
+                index.remove(item)
+                del points[item]
+            self.assertIsNone(index.nearest(0, 0))
+
+    def test_projection_distances_are_in_kilometres(self):
+        project = LocalProjection(41.9)
+        # 0.01 degrees of latitude is about 1.11 km everywhere
+        self.assertAlmostEqual(path_length([project((41.9, 12.5)), project((41.91, 12.5))]), 1.112, places=2)
+
+class TestTwoOpt(unittest.TestCase):
+    def test_two_opt_never_lengthens_and_keeps_start(self):
+        rng = random.Random(1)
+        points = [(rng.random(), rng.random()) for _ in range(60)]
+        order = list(range(len(points)))
+        improved = two_opt(points, order)
+        self.assertEqual(improved[0], 0)
+        self.assertEqual(sorted(improved), order)
+        self.assertLess(path_length([points[i] for i in improved]), path_length(points))
+
+    def test_two_opt_untangles_a_zigzag(self):
+        # Visiting the bottom row, then the top row, is the shortest open path from (0, 0)
+        points = [(0, 0), (1, 1), (1, 0), (2, 1), (2, 0), (3, 1), (3, 0)]
+        improved = two_opt(points, list(range(len(points))))
+        shortest = min(path_length([points[0]] + [points[i] for i in rest])
+                       for rest in permutations(range(1, len(points))))
+        self.assertAlmostEqual(path_length([points[i] for i in improved]), shortest)
+
+if __name__ == "__main__":
+    unittest.main()
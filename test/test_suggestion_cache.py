@@ -0,0 +1,71 @@
+'''
+TripGenius: Tests for the suggestion cache
+
+Checks that cached suggestions survive a restart, that processes sharing a cache
+file keep each other's entries, and that the file is only ever read as JSON.
+'''
+
+import os
+import pickle
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.SuggestionCache import SuggestionCache
+
+def answers(destination: str):
+    return {'destination': destination, 'startDate': '2030-06', 'duration': '3', 'interests': ['Food']}
+
+class TestSuggestionCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'suggestions.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_entries_are_reparsed_on_load(self):
+        cache = SuggestionCache(path=self.path, parser=str.split)
+        self.assertEqual(cache.memoize(answers('Rome'), lambda: 'Colosseum Trastevere'), ['Colosseum', 'Trastevere'])
+
+        reloaded = SuggestionCache(path=self.path, parser=str.split)
+        self.assertEqual(reloaded.get(answers(' rome ')), ['Colosseum', 'Trastevere'])
+
+    def test_caches_sharing_a_file_keep_each_others_entries(self):
+        first = SuggestionCache(path=self.path)
+        second = SuggestionCache(path=self.path)
+        first.set(answers('Rome'), 'Rome text')
+        second.set(answers('Paris'), 'Paris text')
+        first.set(answers('Lisbon'), 'Lisbon text')
+        second.save()
+
+        reloaded = SuggestionCache(path=self.path)
+        for city in ('Rome', 'Paris', 'Lisbon'):
+            self.assertEqual(reloaded.get(answers(city)), f"{city} text")
+
+    def test_save_compacts_to_the_newest_entries(self):
+        cache = SuggestionCache(max_entries=2, path=self.path)
+        for city in ('Rome', 'Paris', 'Rome', 'Lisbon'):
+            cache.set(answers(city), f"{city} text")
+        cache.save()
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+        reloaded = SuggestionCache(max_entries=2, path=self.path)
+        self.assertIsNone(reloaded.get(answers('Paris')))
+        self.assertEqual(reloaded.get(answers('Rome')), 'Rome text')
+
+    def test_pickled_file_is_not_unpickled(self):
+        class Payload:
+            def __reduce__(self):
+                return (exec, ("raise AssertionError('unpickled')",))
+
+        with open(self.path, 'wb') as f:
+            pickle.dump(Payload(), f)
+        cache = SuggestionCache(path=self.path)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+if __name__ == "__main__":
+    unittest.main()
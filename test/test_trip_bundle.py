@@ -0,0 +1,105 @@
+'''
+TripGenius: Tests for the offline trip bundle
+
+Writes a generated trip to a bundle and reads every part of it back.
+'''
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.AlertManager import TripAlertManager
+from features.Scheduling import Activity, TripScheduler
+from features.TripBundle import TripBundle, write_bundle
+
+START = datetime(2030, 6, 1)
+TIMEBLOCKS = ('morning', 'afternoon', 'evening')
+
+def activity_fields(activity: Activity):
+    if activity is None:
+        return None
+    return (activity.name, activity.duration, activity.category, tuple(activity.price),
+            activity.preferred_time, activity.location)
+
+def alert_fields(alert):
+    return (alert.date, alert.title, alert.description, alert.alert_type, alert.priority, alert.acknowledged)
+
+class TestTripBundle(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        self.scheduler = TripScheduler(START, START + timedelta(days=9), seed=0)
+        for i in range(40):
+            self.scheduler.add_activity(Activity(
+                f"Activité {i}", rng.choice([1, 2, 3.5]), rng.choice(['Cultural', 'Food']),
+                (rng.randint(0, 50), rng.randint(50, 100)), rng.choice(TIMEBLOCKS + (None,)),
+                (41.9 + rng.random() / 10, 12.5 + rng.random() / 10) if i % 2 else None
+            ))
+        self.schedule = self.scheduler.generate_schedule()
+        self.booking_info = {}
+        for date, day in self.schedule.items():
+            for timeblock, activity in day.items():
+                if activity:
+                    info = self.booking_info.setdefault(activity.name, {
+                        'booking_url': f"https://book.example/{activity.name}",
+                        'price_range': f"${activity.price[0]}-${activity.price[1]}",
+                        'preferred_time': activity.preferred_time or 'Flexible',
+                        'occurrences': []
+                    })
+                    info['occurrences'].append({'date': date, 'timeblock': timeblock})
+        self.alerts = TripAlertManager(self.scheduler.start_date, self.scheduler.end_date)
+        self.alerts.generate_trip_alerts(self.schedule, self.booking_info)
+        self.alerts.acknowledge_alert(self.alerts.alerts[0])
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'trip.tgb')
+        write_bundle(self.filename, self.scheduler.start_date, self.scheduler.end_date, self.schedule,
+                     self.booking_info, self.alerts.alerts, self.scheduler.activities)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        with TripBundle(self.filename) as bundle:
+            self.assertEqual((bundle.trip_start, bundle.trip_end),
+                             (self.scheduler.start_date, self.scheduler.end_date))
+            self.assertEqual(bundle.dates(), list(self.schedule))
+            schedule = bundle.schedule()
+            self.assertEqual(
+                {date: {block: activity_fields(a) for block, a in day.items()} for date, day in schedule.items()},
+                {date: {block: activity_fields(a) for block, a in day.items()} for date, day in self.schedule.items()}
+            )
+            self.assertEqual(bundle.booking_info(), self.booking_info)
+            self.assertEqual([alert_fields(alert) for alert in bundle.alert_manager().alerts],
+                             [alert_fields(alert) for alert in self.alerts.alerts])
+            self.assertEqual(sorted(activity_fields(bundle.activity(i)) for i in range(bundle.activity_count)),
+                             sorted(activity_fields(activity) for activity in self.scheduler.activities))
+
+    def test_lookups_by_day_and_alert_window(self):
+        date = list(self.schedule)[4]
+        window = (START + timedelta(days=2), START + timedelta(days=5))
+        with TripBundle(self.filename) as bundle:
+            self.assertEqual({block: activity_fields(a) for block, a in bundle.day(date).items()},
+                             {block: activity_fields(a) for block, a in self.schedule[date].items()})
+            self.assertEqual(bundle.day(4).keys(), bundle.day(date).keys())
+            with self.assertRaises(KeyError):
+                bundle.day('1999-01-01')
+            self.assertEqual([alert_fields(alert) for alert in bundle.alerts_between(*window)],
+                             [alert_fields(alert) for alert in self.alerts.get_alerts(*window)])
+
+    def test_close_with_live_string_views(self):
+        bundle = TripBundle(self.filename)
+        name = bundle.string_bytes(0)
+        expected = bytes(name)
+        bundle.close()
+        bundle.close()
+        # The view stays readable; the mapping goes away once it is released
+        self.assertEqual(bytes(name), expected)
+        name.release()
+
+if __name__ == "__main__":
+    unittest.main()